@@ -1,14 +1,23 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-from google.cloud import bigquery
-from google.cloud import bigquery_storage
 from dotenv import load_dotenv
 import os
 from datetime import date
 import plotly.graph_objects as go
 import numpy as np
 from PIL import Image
+import sys
+
+# Make the shared londonbikes package (repo root) importable under `streamlit run`
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from londonbikes.stations import normalise_station_names, build_station_dim
+from londonbikes.dtypes import compact_dtypes
+from londonbikes.store import DatasetStore, DASHBOARD_TABLES
+from londonbikes.arrow_reader import arrow_reader
+from londonbikes.clients import get_bqstorage_client
+from londonbikes import dashboard
+from londonbikes.dashboard import Datasets
+from londonbikes.geo import CATCHMENT_RADII_M
 
 
 
@@ -38,49 +47,72 @@ load_dotenv()
 project_id = os.environ.get("DSAI_PROJECT_ID")
 analytics_dataset = "LondonBicycles_Analytics"
 
-client = bigquery.Client(project=project_id)
-bqstorage_client = bigquery_storage.BigQueryReadClient()
+@st.cache_resource
+def get_reader():
+    # One reader per process on the shared Storage Read client: reruns reuse its credentials and channels.
+    # The client is only built when BigQuery is read, so the Parquet stand-in needs no credentials
+    return arrow_reader(get_bqstorage_client, project_id)
+
+def prepare_table(df, table_name):
+    # Normalise names and shrink dtypes once per loaded table
+    return compact_dtypes(normalise_station_names(df), table_name)
+
+@st.cache_resource
+def get_dataset_store():
+    # One store per process: every session shares the same memory-mapped snapshot
+    return DatasetStore(prepare=prepare_table)
+
+# Pin one snapshot for the whole rerun so all tables come from the same build
+snapshot = get_dataset_store().snapshot()
 
 @st.cache_data(show_spinner=True)
-def load_table(table_name, last_12_months_only=False):
-    if table_name == "route_popularity":
-        # Only load the columns Tab 4 actually needs
-        query = f"""
-        SELECT
-          year,
-          month,
-          day,
-          trip_hour,
-          start_station_name,
-          end_station_name,
-          trip_count
-        FROM `{project_id}.{analytics_dataset}.{table_name}`
-        """
-    else:
-        query = f"SELECT * FROM `{project_id}.{analytics_dataset}.{table_name}`"
-
-    return client.query(query).to_dataframe()
+def query_table(table_name):
+    # Fallback when no snapshot has been exported: stream the table as Arrow batches
+    arrow_table = get_reader().read(analytics_dataset, table_name, DASHBOARD_TABLES.get(table_name))
+    return prepare_table(arrow_table.to_pandas(), table_name)
+
+def load_table(table_name):
+    # Snapshot frames are shared across sessions: never modify them in place
+    if snapshot.has(table_name):
+        return snapshot.frame(table_name)
+    return query_table(table_name)
+
+@st.cache_data(show_spinner=True)
+def load_station_dim(version):
+    # One-time normalised station dimension shared by all tabs (per snapshot version)
+    return build_station_dim(load_table("station_static"))
 
 # -----------------------------
 # Load Tables
 # -----------------------------
-daily_df = load_table("daily_summaries")
-hourly_df = load_table("hourly_counts")
-top_stations_df = load_table("top_stations")
-duration_df = load_table("trip_duration_histogram")
-route_df = load_table("route_popularity")
-duration_band_df = load_table("duration_band")
-return_origin_df = load_table("return_to_origin")
-supply_demand_df = load_table("station_demand_supply_gap")
-station_static = load_table("station_static")
-
-# Combine station trips across all months/years
-top_stations_agg = top_stations_df.groupby('station_name')[['trips_started','trips_ended']].sum().reset_index()
-top_stations_agg['total_trips'] = top_stations_agg['trips_started'] + top_stations_agg['trips_ended']
-
-# Determine latest year for supply/demand analysis
-latest_year = supply_demand_df['year'].max()
-supply_latest_year = supply_demand_df[supply_demand_df['year']==latest_year -1]
+DASHBOARD_TABLE_NAMES = [
+    "monthly_kpis",
+    "quarter_hour_profile",
+    "top_stations",
+    "trip_duration_histogram",
+    "duration_band",
+    "return_to_origin",
+    "station_demand_supply_gap",
+    "route_heatmap_topk",
+    "tourist_catchments",
+    "rebalancing_monthly",
+    "station_demand_forecast",
+]
+# Route rows are only converted when the snapshot does not ship the flow cube
+# and OD matrices built from them (e.g. the BigQuery fallback)
+if snapshot.cube is None or snapshot.od is None:
+    DASHBOARD_TABLE_NAMES.append("route_popularity")
+
+# Tables + station dimension, keyed by dataset version for the per-tab memo
+data = Datasets(
+    snapshot.version or "bigquery",
+    {**{name: load_table(name) for name in DASHBOARD_TABLE_NAMES},
+     "station_dim": load_station_dim(snapshot.version),
+     # Memory-mapped station x day x hour flows; None falls back to building from route_popularity
+     "flow_cube": snapshot.cube,
+     # Sparse per-month/hour start x end matrices; None falls back likewise
+     "od_matrices": snapshot.od}
+)
 
 # -----------------------------
 # Tabs
@@ -91,50 +123,20 @@ with tabs[0]:
     st.header("📊 Overall Trend Analysis")
 
     # ---------------------------
-    # Precompute yearly aggregates
+    # Compute metrics (memoised per dataset version)
     # ---------------------------
-    yearly_trips = daily_df.groupby('year')['trip_count'].sum().reset_index()
-    yearly_duration = daily_df.groupby('year')['avg_duration_minutes'].mean().reset_index()
-
-    # ---------------------------
-    # Identify latest full year
-    # ---------------------------
-    months_per_year = daily_df.groupby('year')['month'].nunique()
-    full_years = months_per_year[months_per_year == 12].index.tolist()
-    if len(full_years) > 0:
-        latest_full_year = max(full_years)
-    else:
-        latest_full_year = daily_df['year'].min()  # fallback
-    prev_year = latest_full_year - 1
-
-    # ---------------------------
-    # Compute metrics
-    # ---------------------------
-    # 1. Average trips per year
-    avg_trips_per_year = yearly_trips['trip_count'].mean()
-
-    # 2. Trips last full year + % change from previous full year
-    trips_last_year = yearly_trips.loc[yearly_trips['year'] == latest_full_year, 'trip_count'].values[0]
-    trips_prev_year = yearly_trips.loc[yearly_trips['year'] == prev_year, 'trip_count'].values[0] if prev_year in yearly_trips['year'].values else None
-    trips_change = (trips_last_year - trips_prev_year) / trips_prev_year * 100 if trips_prev_year else None
-
-    # 3. Average duration (all data)
-    avg_duration = daily_df['avg_duration_minutes'].mean()
-
-    # 4. Latest full year duration + change from previous full year
-    latest_duration = yearly_duration.loc[yearly_duration['year'] == latest_full_year, 'avg_duration_minutes'].values[0]
-    prev_duration = yearly_duration.loc[yearly_duration['year'] == prev_year, 'avg_duration_minutes'].values[0] if prev_year in yearly_duration['year'].values else None
-    duration_change = (latest_duration - prev_duration) if prev_duration else None
-
-    # 5. Year with max trips + total trips
-    year_max_trips_row = yearly_trips.loc[yearly_trips['trip_count'].idxmax()]
-    year_max_trips = year_max_trips_row['year']
-    total_trips_max_year = year_max_trips_row['trip_count']
-
-    # 6. Maximum average duration + year
-    year_max_duration_row = yearly_duration.loc[yearly_duration['avg_duration_minutes'].idxmax()]
-    max_avg_duration = year_max_duration_row['avg_duration_minutes']
-    year_max_avg_duration = year_max_duration_row['year']
+    kpis = dashboard.overall_kpis(data)
+    latest_full_year = kpis['latest_full_year']
+    avg_trips_per_year = kpis['avg_trips_per_year']
+    trips_last_year = kpis['trips_last_year']
+    trips_change = kpis['trips_change']
+    avg_duration = kpis['avg_duration']
+    latest_duration = kpis['latest_duration']
+    duration_change = kpis['duration_change']
+    year_max_trips = kpis['year_max_trips']
+    total_trips_max_year = kpis['total_trips_max_year']
+    max_avg_duration = kpis['max_avg_duration']
+    year_max_avg_duration = kpis['year_max_avg_duration']
 
     # ---------------------------
     # Display metrics in columns
@@ -169,31 +171,8 @@ with tabs[0]:
     )
 
 
-    # Prepare monthly data
-    monthly_df = (
-        daily_df.groupby(['year', 'month'], as_index=False)['trip_count']
-        .sum()
-    )
-
-    # Keep only the last 5 years
-    last_5_years = sorted(monthly_df['year'].unique())[-5:]
-    monthly_df = monthly_df[monthly_df['year'].isin(last_5_years)]
-
-    # Compute monthly average per year
-    yearly_avg_df = (
-        monthly_df.groupby('year', as_index=False)['trip_count']
-        .mean()
-        .rename(columns={'trip_count': 'monthly_avg'})
-    )
-    monthly_df = monthly_df.merge(yearly_avg_df, on='year', how='left')
-
-    # Create a combined period column for x-axis
-    monthly_df['period'] = pd.to_datetime(
-        monthly_df['year'].astype(str) + '-' + monthly_df['month'].astype(str) + '-01'
-    )
-
-    # Convert year to string so Plotly uses distinct colors
-    monthly_df['year'] = monthly_df['year'].astype(str)
+    # Monthly trips for the last 5 years with yearly average
+    monthly_df = dashboard.monthly_trend(data)
 
     # --- Plot ---
     fig_monthly_bar = px.bar(
@@ -233,20 +212,8 @@ with tabs[0]:
 
 
 
-    # Derive quarter from the hourly_df
-    hourly_df['quarter'] = pd.to_datetime(hourly_df['date']).dt.quarter
-
-    # Compute average trip_count by hour and quarter
-    hourly_qtr_agg = (
-        hourly_df
-        .groupby(['quarter', 'trip_hour'], as_index=False)['trip_count']
-        .mean()
-    )
-
-    # Ensure all combinations of quarters and hours exist
-    all_combos = pd.MultiIndex.from_product([range(1, 5), range(24)], names=['quarter', 'trip_hour'])
-    hourly_qtr_agg = hourly_qtr_agg.set_index(['quarter', 'trip_hour']).reindex(all_combos).reset_index()
-    hourly_qtr_agg['trip_count'] = hourly_qtr_agg['trip_count'].fillna(0)
+    # Average trip_count by hour and quarter
+    hourly_qtr_agg = dashboard.quarter_hour_profile(data)
 
     # Plot with color by quarter
     fig_hourly_qtr = px.line(
@@ -268,52 +235,16 @@ with tabs[0]:
 with tabs[1]:
     st.header("🏙️ Station Traffic & Usage Metrics")
 
-    # --- Preprocessing ---
-    station_static['station_name'] = station_static['station_name'].str.strip()
-    top_stations_df['station_name'] = top_stations_df['station_name'].str.strip()
-
-    # Exclude stations without docks
-    station_metrics = station_static[station_static['docks_count'] > 0].copy()
-
-    # Compute inflow + outflow per station
-    station_traffic = top_stations_df.groupby('station_name')[['trips_started', 'trips_ended']].sum()
-    station_traffic['total_trips'] = station_traffic['trips_started'] + station_traffic['trips_ended']
-
-    # Merge with station_static for docks info
-    station_metrics = station_metrics.merge(
-        station_traffic[['total_trips']],
-        on='station_name',
-        how='left'
-    ).fillna(0)
-
     # -----------------------------
-    # Compute Metrics
+    # Compute Metrics (memoised per dataset version)
     # -----------------------------
-    # 1. Total stations
-    total_stations = station_metrics['station_name'].nunique()
-
-    # 2. Total docks
-    total_docks = station_metrics['docks_count'].sum()
-
-    # 3. Average docks per station
-    avg_docks_per_station = station_metrics['docks_count'].mean()
-
-    # 4. Top area (by total trips)
-    top_area_row = top_stations_df.groupby('station_area')[['trips_started', 'trips_ended']].sum()
-    top_area_row['total_trips'] = top_area_row['trips_started'] + top_area_row['trips_ended']
-    top_area = top_area_row['total_trips'].idxmax()
-
-    # 5 & 6. Top station & average daily trips
-    # Compute number of years in the data
-    num_years = top_stations_df['year'].nunique()
-
-    # Compute average daily trips per station (only for stations with docks)
-    station_metrics['avg_daily_trips'] = station_metrics['total_trips'] / (num_years * 365)
-
-    # Get top station by avg daily trips
-    top_station_row = station_metrics.loc[station_metrics['avg_daily_trips'].idxmax()]
-    top_station_name = top_station_row['station_name']
-    avg_trip_per_day_top_station = top_station_row['avg_daily_trips']
+    station_kpis = dashboard.station_kpis(data)
+    total_stations = station_kpis['total_stations']
+    total_docks = station_kpis['total_docks']
+    avg_docks_per_station = station_kpis['avg_docks_per_station']
+    top_area = station_kpis['top_area']
+    top_station_name = station_kpis['top_station_name']
+    avg_trip_per_day_top_station = station_kpis['avg_trip_per_day_top_station']
 
     # -----------------------------
     # Display Metrics: 2 rows x 3 columns
@@ -330,22 +261,11 @@ with tabs[1]:
     col5.metric("🏁 Top Station", top_station_name)
     col6.metric("📊 Avg Trips/Day at Top Station", f"{avg_trip_per_day_top_station:.1f}")
 
-    # --- Compute total traffic (inflow + outflow) ---
-    top_stations_agg['total_traffic'] = top_stations_agg['trips_started'] + top_stations_agg['trips_ended']
-
-    # --- Compute daily average traffic ---
-    if 'date' in daily_df.columns:
-        num_days = (daily_df['date'].max() - daily_df['date'].min()).days + 1
-    else:
-        num_days = len(daily_df)
-
-    top_stations_agg['avg_daily_traffic'] = top_stations_agg['total_traffic'] / num_days
-
     # --- Slider for top N stations ---
     top_n = st.slider("Select Top N Stations by Avg Daily Traffic", 5, 25, 10)
 
     # --- Pick top stations by avg daily traffic ---
-    top_traffic_stations = top_stations_agg.nlargest(top_n, 'avg_daily_traffic')
+    top_traffic_stations = dashboard.top_traffic_stations(data, top_n)
 
     fig_top_avg_traffic = px.bar(
         top_traffic_stations,
@@ -368,49 +288,47 @@ with tabs[1]:
     # Slider for top N areas
     top_area_n = st.slider("Top N Areas to Highlight", 1, 10, 5)
 
-    # Compute total trips per station
-    top_stations_df['total_trips'] = top_stations_df['trips_started'] + top_stations_df['trips_ended']
+    # Whole-network overlay, clustered for the chosen zoom level
+    show_network = st.checkbox("Show whole station network (clustered)", value=False)
+    cluster_zoom = st.slider("Cluster Zoom Level", 10, 16, 12, disabled=not show_network)
 
-    # Aggregate total trips per area and pick top N areas
-    area_agg = (
-        top_stations_df.groupby('station_area')['total_trips'].sum().reset_index()
-        .sort_values('total_trips', ascending=False)
-        .head(top_area_n)
-    )
+    # Stations within walking distance of each tourist spot
+    tourist_radius_m = st.select_slider("Tourist Spot Radius (m)", options=list(CATCHMENT_RADII_M), value=500)
 
-    # Assign letters based on ranking
-    area_agg['area_letter'] = [chr(65+i) for i in range(len(area_agg))]
+    # Top N areas (lettered by rank) and their top 5 stations
+    area_agg, stations_in_top_areas = dashboard.top_area_stations(data, top_area_n)
     area_letter_map = dict(zip(area_agg['station_area'], area_agg['area_letter']))
 
-    # Filter stations belonging to top N areas
-    stations_in_top_areas = top_stations_df[top_stations_df['station_area'].isin(area_agg['station_area'])]
-
-    # Keep only top 5 stations per area
-    stations_in_top_areas = stations_in_top_areas.sort_values(['station_area', 'total_trips'], ascending=[True, False])
-    stations_in_top_areas = stations_in_top_areas.groupby('station_area').head(5)
-
     # Map color per area
     area_colors = px.colors.qualitative.Set1
     area_unique = stations_in_top_areas['station_area'].unique()
     area_color_map = {area: area_colors[i % len(area_colors)] for i, area in enumerate(area_unique)}
 
-    # Add area letters to stations
-    stations_in_top_areas['area_letter'] = stations_in_top_areas['station_area'].map(area_letter_map)
-
-    # Top 8 tourist destinations in London
-    tourist_df = pd.DataFrame({
-        'name': [
-            'London Eye', 'British Museum', 'Tower of London', 'Buckingham Palace',
-            'Big Ben', 'Trafalgar Square', "St Paul's Cathedral", 'Natural History Museum'
-        ],
-        'latitude': [51.5033, 51.5194, 51.5081, 51.5014, 51.5007, 51.5080, 51.5138, 51.4967],
-        'longitude': [-0.1195, -0.1270, -0.0759, -0.1419, -0.1246, -0.1281, -0.0984, -0.1764]
-    })
-    tourist_df['number'] = range(1, len(tourist_df)+1)
+    # Top 8 tourist destinations in London, with nearby stations
+    tourist_df = dashboard.tourist_spot_stations(data, tourist_radius_m)
 
     # Create figure
     fig_map = go.Figure()
 
+    if show_network:
+        clusters = dashboard.network_clusters(data, cluster_zoom)
+        fig_map.add_trace(go.Scattermapbox(
+            lat=clusters['latitude'],
+            lon=clusters['longitude'],
+            mode='markers',
+            marker=dict(
+                size=np.sqrt(clusters['total_trips'] / clusters['total_trips'].max()) * 30 + 4,
+                color='grey',
+                opacity=0.5
+            ),
+            name='All Stations (clustered)',
+            hovertext=[
+                f"{top} +{count - 1} more<br>{trips:,} trips" if count > 1 else f"{top}<br>{trips:,} trips"
+                for top, count, trips in zip(clusters['top_station'], clusters['station_count'], clusters['total_trips'])
+            ],
+            hoverinfo='text'
+        ))
+
     # Add stations: one trace per area
     for area in area_agg['station_area']:
         area_stations = stations_in_top_areas[stations_in_top_areas['station_area'] == area]
@@ -438,14 +356,17 @@ with tabs[1]:
         text=tourist_df['number'].astype(str),
         textposition='middle center',
         name='Tourist Spot',
-        hovertext=tourist_df['name'],
+        hovertext=[
+            f"{name}<br>{count} stations within {tourist_radius_m} m<br>{nearest}"
+            for name, count, nearest in zip(tourist_df['name'], tourist_df['station_count'], tourist_df['nearest_stations'])
+        ],
         hoverinfo='text'
     ))
 
     # Map layout
     fig_map.update_layout(
         mapbox_style="open-street-map",
-        mapbox_zoom=12,
+        mapbox_zoom=cluster_zoom if show_network else 12,
         mapbox_center={"lat": stations_in_top_areas['latitude'].mean(),
                     "lon": stations_in_top_areas['longitude'].mean()},
         height=650,
@@ -458,6 +379,19 @@ with tabs[1]:
     tourist_legend_text = "<br>".join([f"{num}. {name}" for num, name in zip(tourist_df['number'], tourist_df['name'])])
     st.markdown(f"**Tourist Spots Legend:**<br>{tourist_legend_text}", unsafe_allow_html=True)
 
+    # Trips in each tourist spot's catchment (precomputed per radius)
+    catchments = dashboard.tourist_catchments(data, tourist_radius_m)
+    fig_catchments = px.bar(
+        catchments,
+        x='poi_name',
+        y=['trips_started', 'trips_ended'],
+        title=f"Trips at Stations Within {tourist_radius_m} m of Each Tourist Spot",
+        labels={'poi_name': 'Tourist Spot', 'value': 'Trips', 'variable': 'Direction'},
+        hover_data={'station_count': True, 'avg_distance_m': ':.0f'},
+    )
+    fig_catchments.update_layout(barmode='stack', xaxis_title="Tourist Spot", yaxis_title="Trips")
+    st.plotly_chart(fig_catchments, use_container_width=True)
+
 
     # -----------------------------
     # Heatmap: Top Start & End Routes by Hour
@@ -473,34 +407,8 @@ with tabs[1]:
         format_func=lambda x: f"{x}:00 - {x}:59"
     )
 
-    # Filter route_df by selected hour
-    route_hour_df = route_df[route_df['trip_hour'] == selected_hour_1]
-
-    # Compute total trips per start and end station
-    route_agg = route_hour_df.groupby(['start_station_name', 'end_station_name'])['trip_count'].sum().reset_index()
-
-    # Pick top 10 start stations by total trips
-    top_start_stations = (
-        route_agg.groupby('start_station_name')['trip_count'].sum()
-        .nlargest(10)
-        .index
-    )
-
-    # Pick top 10 end stations by total trips
-    top_end_stations = (
-        route_agg.groupby('end_station_name')['trip_count'].sum()
-        .nlargest(10)
-        .index
-    )
-
-    # Filter the data
-    route_heatmap_df = route_agg[
-        route_agg['start_station_name'].isin(top_start_stations) &
-        route_agg['end_station_name'].isin(top_end_stations)
-    ]
-
-    # Create pivot table for heatmap
-    heatmap_data = route_heatmap_df.pivot(index='start_station_name', columns='end_station_name', values='trip_count').fillna(0)
+    # Top start x end station matrix for the selected hour (precomputed per hour)
+    heatmap_data = dashboard.route_heatmap(data, selected_hour_1)
 
     # Plot heatmap
     fig_heatmap = px.imshow(
@@ -514,47 +422,27 @@ with tabs[1]:
 
     st.plotly_chart(fig_heatmap, use_container_width=True)
 
+    # Busiest individual routes at the same hour (sparse OD reduction, last 12 months)
+    top_routes_df = dashboard.top_routes(data, selected_hour_1, 10)
+    fig_top_routes = px.bar(
+        top_routes_df.assign(route=top_routes_df['start_station_name'] + " → " + top_routes_df['end_station_name']),
+        x='trip_count',
+        y='route',
+        orientation='h',
+        title=f"Top 10 Routes (Hour {selected_hour_1}:00, Last 12 Months)",
+        labels={'trip_count': 'Trips', 'route': 'Route'}
+    )
+    fig_top_routes.update_layout(yaxis={'categoryorder': 'total ascending'})
+    st.plotly_chart(fig_top_routes, use_container_width=True)
+
     # -----------------------------
     # Least Utilized Stations (Last 12 Months)
     # -----------------------------
     st.header("❄️ Least Utilized Stations (Last 12 Months)")
 
-    # Last 12 months filter
-    route_df['year_month'] = route_df['year']*100 + route_df['month']
-    last_12_ym = sorted(route_df['year_month'].unique())[-12:]
-    route_12m_df = route_df[route_df['year_month'].isin(last_12_ym)]
-
-    # Compute inflow per station
-    inflow_df = route_12m_df.groupby('end_station_name')['trip_count'].sum().reset_index(name='inflow')
-
-    # Compute outflow per station
-    outflow_df = route_12m_df.groupby('start_station_name')['trip_count'].sum().reset_index(name='outflow')
-
-    # Merge inflow + outflow
-    station_usage = pd.merge(
-        inflow_df, outflow_df,
-        left_on='end_station_name', right_on='start_station_name',
-        how='outer'
-    ).fillna(0)
-
-    # Compute total traffic
-    station_usage['total_traffic'] = station_usage['inflow'] + station_usage['outflow']
-
-    # Use one station_name column and drop redundant
-    station_usage['station_name'] = station_usage['end_station_name'].combine_first(station_usage['start_station_name'])
-    station_usage = station_usage[['station_name', 'inflow', 'outflow', 'total_traffic']]
-
-    # Merge docks_count from station_static and exclude stations with 0 docks
-    station_usage = station_usage.merge(
-        station_static[['station_name', 'docks_count']],
-        on='station_name',
-        how='left'
-    )
-    station_usage = station_usage[station_usage['docks_count'] > 0]
-
     # Pick bottom N stations
     bottom_n = 10
-    least_used_stations = station_usage.nsmallest(bottom_n, 'total_traffic')
+    least_used_stations = dashboard.least_utilised_stations(data, bottom_n)
 
     # Plot bar chart
     fig_least_used = px.bar(
@@ -579,34 +467,16 @@ with tabs[2]:
 
     st.header("⏱️ Trip Duration & Return to Origin Analysis")
 
-    # Filter duration <= 60 min
-    duration_df_filtered = hourly_df.copy()
-    duration_df_filtered['duration_min'] = duration_df_filtered['avg_duration_minutes']
-    duration_df_filtered = duration_df_filtered[(duration_df_filtered['duration_min'] > 0) &
-                                                (duration_df_filtered['duration_min'] <= 60)]
-
-    # --- Determine the latest full year dynamically ---
-    year_counts = duration_df_filtered.groupby('year')['month'].nunique()
-    full_years = year_counts[year_counts == 12].index  # Only years with all 12 months
-    latest_full_year = full_years.max()
-    prev_full_year = latest_full_year - 1
-
-    # --- Row 1: % Trips <=30 min ---
-    pct_below_30 = (duration_df_filtered['duration_min'] <= 30).mean() * 100
-
-    # --- Row 2: % Trips >30 min in latest full year and comparison ---
-    latest_year_df = duration_df_filtered[duration_df_filtered['year'] == latest_full_year]
-    prev_year_df = duration_df_filtered[duration_df_filtered['year'] == prev_full_year]
-
-    pct_above_30_latest = (latest_year_df['duration_min'] > 30).mean() * 100
-    pct_above_30_prev = (prev_year_df['duration_min'] > 30).mean() * 100
-    pct_above_30_change = pct_above_30_latest - pct_above_30_prev
-
-    # --- Row 3: Median duration across all years ---
-    median_all_years = duration_df_filtered['duration_min'].median()
-
-    # --- Row 4: Median duration in latest full year ---
-    median_latest_year = latest_year_df['duration_min'].median()
+    # All duration stats come from trip_duration_histogram (trip counts per
+    # 1-minute bin), so percentiles and shares are exact per trip rather than
+    # averages of hourly averages.
+    duration_stats = dashboard.duration_summary(data)
+    latest_full_year = duration_stats['latest_full_year']
+    pct_below_30 = duration_stats['pct_below_30']
+    pct_above_30_latest = duration_stats['pct_above_30_latest']
+    pct_above_30_change = duration_stats['pct_above_30_change']
+    median_all_years = duration_stats['median_all_years']
+    median_latest_year = duration_stats['median_latest_year']
 
     # --- Row 1 Metrics ---
     col1, col2 = st.columns(2)
@@ -627,8 +497,7 @@ with tabs[2]:
     # Year Filter for Duration Bands
     # -----------------------------
     # Get unique years sorted
-    available_years = sorted(duration_df_filtered['year'].unique())
-    available_years_str = [str(y) for y in available_years]
+    available_years_str = [str(y) for y in duration_stats['years']]
 
     # Add "All" option at the top
     year_options = ["All"] + available_years_str
@@ -640,36 +509,11 @@ with tabs[2]:
         index=0  # default = "All"
     )
 
-    # Filter data based on selected year
-    if selected_year != "All":
-        duration_band_data = duration_df_filtered[duration_df_filtered['year'] == int(selected_year)]
-    else:
-        duration_band_data = duration_df_filtered.copy()
-
     # -----------------------------
     # Duration Bands Bar Chart with Correct %
     # -----------------------------
-    # Define duration bands
-    bins = [0, 5, 15, 30, 45, 60, float('inf')]
-    labels = ['Under 5 min', '5-15 min', '15-30 min', '30-45 min', '45-60 min', 'Over 60 min']
-
-    # Bin the durations
-    duration_band_data['duration_band'] = pd.cut(
-        duration_band_data['duration_min'],
-        bins=bins,
-        labels=labels,
-        right=True
-    )
-
-    # Compute counts per band
-    duration_band_df = (
-        duration_band_data.groupby('duration_band')
-        .size()
-        .reset_index(name='trip_count')
-    )
-
-    # Compute % for each band
-    duration_band_df['pct'] = (duration_band_df['trip_count'] / duration_band_df['trip_count'].sum() * 100).round(1)
+    labels = dashboard.DURATION_BAND_LABELS
+    duration_band_df = dashboard.duration_bands(data, selected_year)
 
     # Create bar chart
     fig_duration_band = px.bar(
@@ -698,28 +542,53 @@ with tabs[2]:
     st.plotly_chart(fig_duration_band, use_container_width=True)
 
     # --- Violin Plot with improved colors and taller layout ---
-    fig_violin = px.violin(
-        duration_df_filtered,
-        y='duration_min',
-        box=True,
-        points='all',
-        color_discrete_sequence=['#FF6F3C'],  # Orange/Maroon-ish
-        title="Trip Duration Distribution (Violin Plot, <= 60 min)",
-        labels={'duration_min': 'Trip Duration (minutes)'}
-    )
-
-    # Show mean line
-    fig_violin.update_traces(meanline_visible=True)
+    # Density, box stats and points all come from trip_duration_histogram, so the
+    # payload is a fixed-size curve plus a bounded sample regardless of history.
+    violin = dashboard.violin_stats(data)
+    violin_grid = violin['grid']
+    violin_width = violin['density'] / violin['density'].max() * 0.4  # half-width in x units
+    violin_sample = violin['sample']
+
+    fig_violin = go.Figure()
+    fig_violin.add_trace(go.Scatter(
+        x=np.concatenate([violin_width, -violin_width[::-1]]),
+        y=np.concatenate([violin_grid, violin_grid[::-1]]),
+        fill='toself',
+        mode='lines',
+        line=dict(color='#FF6F3C'),  # Orange/Maroon-ish
+        name='Density',
+        hoverinfo='skip'
+    ))
+    fig_violin.add_trace(go.Box(
+        x=[0],
+        q1=[violin['q1']], median=[violin['median']], q3=[violin['q3']],
+        lowerfence=[violin['lowerfence']],
+        upperfence=[violin['upperfence']],
+        mean=[violin['mean']],  # show mean line
+        width=0.1,
+        marker_color='#8B0000',
+        name='Quartiles'
+    ))
+    fig_violin.add_trace(go.Scatter(
+        x=np.random.default_rng(1).uniform(-0.6, -0.5, size=len(violin_sample)),
+        y=violin_sample,
+        mode='markers',
+        marker=dict(size=3, color='#FF6F3C', opacity=0.5),
+        name=f'Sampled trips (n={len(violin_sample)})'
+    ))
 
     # Increase height to spread out scatter points
     fig_violin.update_layout(
+        title="Trip Duration Distribution (Violin Plot, <= 60 min)",
+        yaxis_title='Trip Duration (minutes)',
+        xaxis=dict(showticklabels=False, zeroline=False),
         height=1000  # increase height in pixels
     )
 
     st.plotly_chart(fig_violin, use_container_width=True)
 
-    # --- Hour-of-Day vs Avg Duration ---
-    hourly_avg = duration_df_filtered.groupby('trip_hour')['duration_min'].mean().reset_index()
+    # --- Hour-of-Day vs Avg Duration (trip-weighted, from the histogram) ---
+    hourly_avg = dashboard.hourly_avg_duration(data)
     fig_hourly = px.line(
         hourly_avg,
         x='trip_hour',
@@ -742,8 +611,7 @@ with tabs[3]:
     # -----------------------------
     # Prepare year-month list
     # -----------------------------
-    route_df['year_month'] = route_df['year']*100 + route_df['month']
-    ym_list = sorted(route_df['year_month'].unique())
+    ym_list = dashboard.route_year_months(data)
     ym_map = {ym: f"{str(ym)[:4]}-{str(ym)[4:].zfill(2)}" for ym in ym_list}
     ym_options = ["All"] + [ym_map[ym] for ym in ym_list]
 
@@ -754,15 +622,8 @@ with tabs[3]:
         index=0  # default "All"
     )
 
-    # -----------------------------
-    # Filter last 12 months or selected month
-    # -----------------------------
-    last_12_ym = sorted(route_df['year_month'].unique())[-12:]
-    if selected_ym == "All":
-        route_12m_df = route_df[route_df['year_month'].isin(last_12_ym)]
-    else:
-        ym_key = [k for k, v in ym_map.items() if v == selected_ym][0]
-        route_12m_df = route_df[route_df['year_month'] == ym_key]
+    # None = last 12 months
+    ym_key = None if selected_ym == "All" else [k for k, v in ym_map.items() if v == selected_ym][0]
 
     # -----------------------------
     # Select Hour Filter
@@ -774,75 +635,6 @@ with tabs[3]:
         format_func=lambda x: f"{x}:00 - {x}:59"
     )
 
-    # -----------------------------
-    # Compute inflow per station per day/hour
-    # -----------------------------
-    inflow_df = (
-        route_12m_df.groupby(['end_station_name', 'year', 'month', 'day', 'trip_hour'], as_index=False)
-        ['trip_count'].sum()
-        .rename(columns={'end_station_name': 'station_name', 'trip_count': 'inflow'})
-    )
-
-    # -----------------------------
-    # Compute outflow per station per day/hour
-    # -----------------------------
-    outflow_df = (
-        route_12m_df.groupby(['start_station_name', 'year', 'month', 'day', 'trip_hour'], as_index=False)
-        ['trip_count'].sum()
-        .rename(columns={'start_station_name': 'station_name', 'trip_count': 'outflow'})
-    )
-
-    # -----------------------------
-    # Strip station names
-    # -----------------------------
-    inflow_df['station_name'] = inflow_df['station_name'].str.strip()
-    outflow_df['station_name'] = outflow_df['station_name'].str.strip()
-    station_static['station_name'] = station_static['station_name'].str.strip()
-
-    # -----------------------------
-    # Merge inflow + outflow per station/day/hour
-    # -----------------------------
-    hourly_net_df = pd.merge(
-        inflow_df,
-        outflow_df,
-        on=['station_name', 'year', 'month', 'day', 'trip_hour'],
-        how='outer'
-    ).fillna(0)
-
-    # Filter by selected hour
-    hourly_net_df = hourly_net_df[hourly_net_df['trip_hour'] == selected_hour]
-
-    # Compute net flow per station/hour/day
-    hourly_net_df['net_flow'] = hourly_net_df['inflow'] - hourly_net_df['outflow']
-
-    # -----------------------------
-    # Aggregate over all days → average for selected hour
-    # -----------------------------
-    station_metrics = hourly_net_df.groupby('station_name').agg(
-        avg_hourly_inflow=('inflow', 'mean'),
-        avg_hourly_outflow=('outflow', 'mean'),
-        avg_hourly_net=('net_flow', 'mean')
-    ).reset_index()
-
-    # Merge docks_count from station_static
-    station_metrics = station_metrics.merge(
-        station_static[['station_name', 'docks_count']],
-        on='station_name', how='left'
-    )
-
-    # Exclude stations with 0 docks
-    station_metrics = station_metrics[station_metrics['docks_count'] > 0]
-
-    # -----------------------------
-    # Compute utilization per dock
-    # -----------------------------
-    station_metrics['utilization_net'] = station_metrics['avg_hourly_net'] / station_metrics['docks_count']
-    station_metrics['utilization_inflow'] = station_metrics['avg_hourly_inflow'] / station_metrics['docks_count']
-    station_metrics['utilization_outflow'] = station_metrics['avg_hourly_outflow'] / station_metrics['docks_count']
-    station_metrics['utilization_total'] = (
-        station_metrics['avg_hourly_inflow'] + station_metrics['avg_hourly_outflow']
-    ) / station_metrics['docks_count']
-
     # -----------------------------
     # Slider: top N stations
     # -----------------------------
@@ -851,15 +643,8 @@ with tabs[3]:
     # -----------------------------
     # Graph 1: Top Net Utilization
     # -----------------------------
-    top_imbalance = station_metrics.reindex(
-        station_metrics['utilization_net'].abs().sort_values(ascending=False).index
-    ).head(top_n)
-
-    # Add station label with docks
-    top_imbalance['station_label'] = top_imbalance.apply(
-        lambda x: f"{x['station_name']} ({x['docks_count']} docks)",
-        axis=1
-    )
+    # Station labels with docks are preformatted in the transform
+    top_imbalance = dashboard.top_net_utilisation(data, ym_key, selected_hour, top_n)
 
     fig_imbalance = px.bar(
         top_imbalance,
@@ -871,6 +656,19 @@ with tabs[3]:
               f"({selected_ym if selected_ym!='All' else 'Last 12 Months'}, Hour {selected_hour}:00)",
         labels={'utilization_net': 'Net Utilization (per dock)'},
     )
+
+    # Overlay: next-day forecast net flow per dock for the same stations and hour
+    forecast_top = dashboard.net_utilisation_forecast(data, ym_key, selected_hour, top_n)
+    forecast_date = forecast_top['forecast_date'].dropna()
+    fig_imbalance.add_trace(go.Scatter(
+        x=forecast_top['station_label'],
+        y=forecast_top['forecast_net_per_dock'],
+        mode='markers',
+        marker=dict(symbol='diamond', size=11, color='black'),
+        name=f"Forecast {forecast_date.iloc[0]}" if len(forecast_date) else "Forecast",
+        hovertemplate="%{x}<br>Forecast net per dock: %{y:.2f}<extra></extra>"
+    ))
+    fig_imbalance.update_layout(legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1))
     st.plotly_chart(fig_imbalance, use_container_width=True)
 
     # Add business explanation
@@ -878,19 +676,14 @@ with tabs[3]:
     **Interpretation: Net Utilization per Dock**  
     - Positive values → More bikes coming in than leaving → station fills up quickly, may run out of space.  
     - Negative values → More bikes leaving than coming in → station empties quickly, may run out of bikes.  
-    - High absolute values → extreme imbalance; consider prioritizing these stations for **rebalancing** or **dock adjustments**.
+    - High absolute values → extreme imbalance; consider prioritizing these stations for **rebalancing** or **dock adjustments**.  
+    - ◆ Black diamonds → forecast net flow per dock at this hour for the day after the latest data (weekday baseline + recent-days regression).
     """)
 
     # -----------------------------
     # Graph 2: Top Total Traffic Utilization
     # -----------------------------
-    top_traffic = station_metrics.nlargest(top_n, 'utilization_total')
-
-    # Add station label with docks
-    top_traffic['station_label'] = top_traffic.apply(
-        lambda x: f"{x['station_name']} ({x['docks_count']} docks)",
-        axis=1
-    )
+    top_traffic = dashboard.top_total_utilisation(data, ym_key, selected_hour, top_n)
 
     fig_traffic = px.bar(
         top_traffic,
@@ -910,4 +703,27 @@ with tabs[3]:
     - Measures the intensity of activity relative to dock capacity, ignoring direction.  
     - High values → very busy stations; may require **maintenance, staffing, or dock expansion**.  
     - Compare with net utilization to determine if a station is both busy and imbalanced during peak hours.
-    """)
\ No newline at end of file
+    """)
+
+    # -----------------------------
+    # Graph 3: Inferred Rebalancing Moves
+    # -----------------------------
+    top_rebalanced = dashboard.top_rebalanced_stations(data, ym_key, selected_hour, top_n)
+
+    fig_rebalanced = px.bar(
+        top_rebalanced,
+        x='station_label',
+        y=['bikes_added', 'bikes_removed'],
+        barmode='group',
+        title=f"Top {top_n} Stations by Inferred Rebalancing Moves "
+              f"({selected_ym if selected_ym!='All' else 'Last 12 Months'}, Hour {selected_hour}:00)",
+        labels={'value': 'Bikes Moved', 'variable': 'Direction', 'station_label': 'Station'},
+    )
+    st.plotly_chart(fig_rebalanced, use_container_width=True)
+
+    st.markdown("""
+    **Interpretation: Inferred Rebalancing Moves**  
+    - A move is inferred when a bike's next trip starts at a different station than its previous trip ended.  
+    - Moves are counted in the hour the bike reappears: **added** at the station it reappears at, **removed** from the station it was left at.  
+    - Stations with large net additions are being refilled by the operator; compare with net utilization above to see whether rebalancing keeps up.
+    """)
@@ -1,20 +1,22 @@
 from great_expectations import get_context
 from great_expectations.core.expectation_suite import ExpectationSuite
-from google.cloud import bigquery
+from londonbikes.clients import get_bigquery_client
+from londonbikes.budget import QueryBudget, GB
 
-def get_valid_stations():
+# One budget for the whole run: every query counts toward the same totals and report
+budget = QueryBudget(get_bigquery_client())
+
+def get_valid_stations(budget):
     """
     Query BigQuery to fetch distinct station_ids from stg_cycle_stations.
     """
-    client = bigquery.Client()
-
     query = """
         SELECT DISTINCT id
         FROM `decisive-studio-469008-m2.LondonBicycles_Raw.cycle_stations_raw`
         WHERE id IS NOT NULL
     """
 
-    query_job = client.query(query)
+    query_job = budget.query(query, label="valid_stations")
     results = query_job.result()
 
     valid_stations = [row.id for row in results]
@@ -68,7 +70,7 @@ print("Validator ready!")
 validator.expect_column_values_to_be_between("duration", min_value=0, max_value=86400,mostly=0.995)  # max 24 hours
 validator.expect_column_values_to_not_be_null("start_station_id",mostly=0.98)
 
-valid_stations = get_valid_stations()
+valid_stations = get_valid_stations(budget)
 validator.expect_column_values_to_be_in_set("start_station_id",value_set=valid_stations)
 validator.expect_column_values_to_not_be_null("end_station_id",mostly=0.98)
 
@@ -90,3 +92,7 @@ checkpoint = context.add_or_update_checkpoint(
 result = checkpoint.run()
 print("Validation complete! Results available in Data Docs.")
 
+run_summary = budget.summary()
+print(f"✅ {run_summary['query_count']} queries: {run_summary['estimated_bytes'] / GB:.2f} GB estimated, "
+      f"{run_summary['billed_bytes'] / GB:.2f} GB billed, {run_summary['seconds']:.0f}s")
+
@@ -0,0 +1,134 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# -----------------------------
+# Arrow readers for analytics tables
+# -----------------------------
+# Tables are read as streams of Arrow record batches and assembled with
+# pa.Table.from_batches, which keeps every batch's buffers as they arrived
+# (no concatenation copy). Both readers share the interface
+#   batches(dataset, table_name, columns=None) -> iterator of RecordBatch
+#   read(dataset, table_name, columns=None)    -> pa.Table
+# so callers can swap BigQuery for a local Parquet stand-in.
+
+# Directory of <table_name>.parquet files that replaces BigQuery when set
+PARQUET_DIR = os.environ.get("LONDONBIKES_PARQUET_DIR")
+MAX_STREAMS = 4
+
+_DONE = object()
+
+
+class BigQueryArrowReader:
+    """
+    Reads tables through the BigQuery Storage Read API in Arrow format,
+    pulling up to max_streams server-side streams in parallel.
+    """
+
+    def __init__(self, bqstorage_client, project_id, max_streams=MAX_STREAMS):
+        self._client = bqstorage_client
+        self.project_id = project_id
+        self.max_streams = max_streams
+
+    def _session(self, dataset, table_name, columns):
+        # Imported here so the Parquet stand-in works without the storage client
+        from google.cloud.bigquery_storage import types
+
+        requested_session = types.ReadSession(
+            table=f"projects/{self.project_id}/datasets/{dataset}/tables/{table_name}",
+            data_format=types.DataFormat.ARROW,
+            read_options=types.ReadSession.TableReadOptions(selected_fields=list(columns or [])),
+        )
+        return self._client.create_read_session(
+            parent=f"projects/{self.project_id}",
+            read_session=requested_session,
+            max_stream_count=self.max_streams,
+        )
+
+    @staticmethod
+    def _schema(session):
+        return pa.ipc.read_schema(pa.py_buffer(session.arrow_schema.serialized_schema))
+
+    def _stream_batches(self, session):
+        streams = list(session.streams)
+        if not streams:
+            return
+
+        batches = queue.Queue(maxsize=2 * len(streams))
+        stop = threading.Event()
+
+        def put(item):
+            # Give up once the consumer has gone away instead of blocking forever
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def pump(stream):
+            try:
+                for page in self._client.read_rows(stream.name).rows(session).pages:
+                    if stop.is_set():
+                        return
+                    put(page.to_arrow())
+            except Exception as exc:
+                put(exc)
+            finally:
+                put(_DONE)
+
+        with ThreadPoolExecutor(max_workers=len(streams)) as pool:
+            for stream in streams:
+                pool.submit(pump, stream)
+            try:
+                remaining = len(streams)
+                while remaining:
+                    item = batches.get()
+                    if item is _DONE:
+                        remaining -= 1
+                    elif isinstance(item, Exception):
+                        raise item
+                    else:
+                        yield item
+            finally:
+                stop.set()
+
+    def batches(self, dataset, table_name, columns=None):
+        """Record batches from all streams, in arrival order."""
+        yield from self._stream_batches(self._session(dataset, table_name, columns))
+
+    def read(self, dataset, table_name, columns=None):
+        """Whole table (optionally projected) as one pa.Table."""
+        session = self._session(dataset, table_name, columns)
+        return pa.Table.from_batches(list(self._stream_batches(session)), schema=self._schema(session))
+
+
+class ParquetArrowReader:
+    """Local stand-in: reads root/<table_name>.parquet, ignoring the dataset."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, table_name):
+        return os.path.join(self.root, f"{table_name}.parquet")
+
+    def batches(self, dataset, table_name, columns=None):
+        yield from pq.ParquetFile(self._path(table_name), memory_map=True).iter_batches(columns=columns)
+
+    def read(self, dataset, table_name, columns=None):
+        return pq.read_table(self._path(table_name), columns=columns, memory_map=True)
+
+
+def arrow_reader(get_bqstorage_client, project_id, parquet_dir=PARQUET_DIR, max_streams=MAX_STREAMS):
+    """
+    The Parquet stand-in when parquet_dir is set, otherwise the Storage Read
+    API. get_bqstorage_client is only called in the latter case, so the
+    stand-in runs without Google Cloud credentials.
+    """
+    if parquet_dir:
+        return ParquetArrowReader(parquet_dir)
+    return BigQueryArrowReader(get_bqstorage_client(), project_id, max_streams=max_streams)
@@ -0,0 +1,122 @@
+import copy
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Query byte budget
+# -----------------------------
+# Every statement is dry-run first (free, returns the bytes it would scan).
+# Above the per-query or per-run budget the query is refused, or only logged
+# in "warn" mode. In refuse mode the real job also carries
+# maximum_bytes_billed, so BigQuery enforces the same limit server-side.
+GB = 1024 ** 3
+MAX_QUERY_BYTES = int(float(os.environ.get("LONDONBIKES_MAX_QUERY_GB", "50")) * GB)
+MAX_RUN_BYTES = int(float(os.environ.get("LONDONBIKES_MAX_RUN_GB", "200")) * GB)
+BUDGET_MODE = os.environ.get("LONDONBIKES_BUDGET_MODE", "refuse")   # "refuse" or "warn"
+# JSON file the per-run totals are written to (set by the Dagster asset)
+BUDGET_REPORT = os.environ.get("LONDONBIKES_BUDGET_REPORT")
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class QueryBudget:
+    """Dry-runs, budgets and records every query sent through query()."""
+
+    def __init__(self, client, max_query_bytes=MAX_QUERY_BYTES, max_run_bytes=MAX_RUN_BYTES,
+                 mode=BUDGET_MODE, report_path=BUDGET_REPORT):
+        if mode not in ("refuse", "warn"):
+            raise ValueError(f"Unknown budget mode: {mode}")
+        self._client = client
+        self.max_query_bytes = max_query_bytes
+        self.max_run_bytes = max_run_bytes
+        self.mode = mode
+        self.report_path = report_path
+        self.queries = []
+
+    def estimate(self, sql, job_config=None):
+        """Bytes the statement would process, from a dry run."""
+        from google.cloud import bigquery
+
+        dry_config = copy.deepcopy(job_config) if job_config is not None else bigquery.QueryJobConfig()
+        dry_config.dry_run = True
+        dry_config.use_query_cache = False
+        return self._client.query(sql, job_config=dry_config).total_bytes_processed or 0
+
+    def _check(self, label, estimated):
+        run_total = self.estimated_bytes + estimated
+        problems = []
+        if estimated > self.max_query_bytes:
+            problems.append(f"{estimated / GB:.2f} GB exceeds the per-query budget of {self.max_query_bytes / GB:.2f} GB")
+        if run_total > self.max_run_bytes:
+            problems.append(f"run total {run_total / GB:.2f} GB exceeds the per-run budget of {self.max_run_bytes / GB:.2f} GB")
+        if not problems:
+            return
+        message = f"Query '{label}': " + "; ".join(problems)
+        if self.mode == "refuse":
+            self._record(label, estimated, status="refused")
+            raise BudgetExceeded(message)
+        logger.warning(message)
+
+    def query(self, sql, job_config=None, label=None):
+        """
+        Dry-run, check the budgets, then run the statement and wait for it.
+        Returns the finished QueryJob.
+        """
+        from google.cloud import bigquery
+
+        if label is None:
+            destination = getattr(job_config, "destination", None)
+            label = str(destination) if destination else " ".join(sql.split())[:60]
+
+        estimated = self.estimate(sql, job_config)
+        self._check(label, estimated)
+
+        if self.mode == "refuse":
+            job_config = copy.deepcopy(job_config) if job_config is not None else bigquery.QueryJobConfig()
+            job_config.maximum_bytes_billed = self.max_query_bytes
+
+        start = time.perf_counter()
+        job = self._client.query(sql, job_config=job_config)
+        job.result()
+        self._record(
+            label, estimated, status="ok",
+            billed_bytes=job.total_bytes_billed or 0,
+            seconds=round(time.perf_counter() - start, 2),
+        )
+        return job
+
+    def _record(self, label, estimated, status, billed_bytes=0, seconds=0.0):
+        self.queries.append({
+            "label": label, "status": status, "estimated_bytes": estimated,
+            "billed_bytes": billed_bytes, "seconds": seconds,
+        })
+        logger.info("%s: %s, %.3f GB estimated, %.3f GB billed, %.1fs",
+                    label, status, estimated / GB, billed_bytes / GB, seconds)
+        # Rewritten after every query so a failed run still reports what ran
+        if self.report_path:
+            with open(self.report_path, "w") as f:
+                json.dump(self.summary(), f, indent=2)
+
+    @property
+    def estimated_bytes(self):
+        return sum(q["estimated_bytes"] for q in self.queries if q["status"] == "ok")
+
+    def summary(self):
+        """Run totals plus one entry per query."""
+        return {
+            "query_count": len(self.queries),
+            "refused_count": sum(q["status"] == "refused" for q in self.queries),
+            "estimated_bytes": self.estimated_bytes,
+            "billed_bytes": sum(q["billed_bytes"] for q in self.queries),
+            "seconds": round(sum(q["seconds"] for q in self.queries), 2),
+            "max_query_bytes": self.max_query_bytes,
+            "max_run_bytes": self.max_run_bytes,
+            "mode": self.mode,
+            "queries": self.queries,
+        }
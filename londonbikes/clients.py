@@ -0,0 +1,57 @@
+import os
+import threading
+
+# -----------------------------
+# Shared Google Cloud clients
+# -----------------------------
+# One BigQuery client per project and one Storage Read client per process,
+# created on first use. They share a single set of application default
+# credentials, so token refreshes and HTTP/gRPC connections are reused by
+# every caller in the process. Keys include the pid: a forked worker builds
+# its own clients instead of sharing its parent's sockets.
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def _get_or_create(key, create):
+    key = (os.getpid(),) + key
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = create()
+    return client
+
+
+def get_credentials():
+    """Application default credentials and their project, resolved once per process."""
+    def create():
+        import google.auth
+        return google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+    return _get_or_create(("credentials",), create)
+
+
+def get_bigquery_client(project_id=None):
+    """
+    Process-wide BigQuery client. project_id defaults to DSAI_PROJECT_ID,
+    then to the credentials' project.
+    """
+    credentials, default_project = get_credentials()
+    project_id = project_id or os.environ.get("DSAI_PROJECT_ID") or default_project
+
+    def create():
+        from google.cloud import bigquery
+        return bigquery.Client(project=project_id, credentials=credentials)
+    return _get_or_create(("bigquery", project_id), create)
+
+
+def get_bqstorage_client():
+    """Process-wide BigQuery Storage Read API client."""
+    credentials, _ = get_credentials()
+
+    def create():
+        from google.cloud import bigquery_storage
+        return bigquery_storage.BigQueryReadClient(credentials=credentials)
+    return _get_or_create(("bqstorage",), create)
@@ -0,0 +1,575 @@
+import weakref
+from functools import lru_cache, wraps
+
+import numpy as np
+import pandas as pd
+
+from londonbikes.stations import station_labels
+from londonbikes.geo import TOURIST_SPOTS, station_totals, GridIndex, cluster_stations
+from londonbikes.flow_cube import IN, OUT, build_flow_cube, month_bounds
+from londonbikes.od_matrix import build_od_matrices
+from londonbikes.duration import (
+    histogram_counts, weighted_quantiles, weighted_mean, kde_from_histogram, sample_points,
+    year_histograms, share_at_most, median_minutes, band_counts
+)
+
+# -----------------------------
+# Per-tab dashboard transforms
+# -----------------------------
+# Every transform is a pure function of (datasets, widget values) memoised with
+# an LRU cache keyed on (dataset version, widget values), so a widget change
+# recomputes only the transforms that take that widget, and only on a miss;
+# a new dataset version misses everywhere. Keys hold the Datasets only weakly:
+# sessions on an old and a new version share the caches during a snapshot
+# refresh, and the old version's entries simply age out of the LRU. Returned
+# frames are shared between sessions and must not be modified by callers.
+
+STATIC_CACHE_SIZE = 4     # one entry per live dataset version
+WIDGET_CACHE_SIZE = 64    # dataset versions x widget values
+
+
+class Datasets:
+    """Loaded dashboard tables keyed by table name, hashed by dataset version."""
+
+    def __init__(self, version, frames):
+        self.version = version
+        self.frames = frames
+
+    def __getitem__(self, table_name):
+        return self.frames[table_name]
+
+    def __hash__(self):
+        return hash(self.version)
+
+    def __eq__(self, other):
+        return isinstance(other, Datasets) and self.version == other.version
+
+
+class _VersionKey:
+    """Memo key for a Datasets: compares by version, references the tables weakly."""
+
+    def __init__(self, data):
+        self.version = data.version
+        self.datasets = weakref.ref(data)
+
+    def __hash__(self):
+        return hash(self.version)
+
+    def __eq__(self, other):
+        return isinstance(other, _VersionKey) and self.version == other.version
+
+
+def memoise(maxsize):
+    """lru_cache for transform(data, ...) keyed on data.version instead of the Datasets."""
+    def decorate(transform):
+        @lru_cache(maxsize=maxsize)
+        def cached(key, *args, **kwargs):
+            # Only reached on a miss, while the caller still holds the Datasets
+            return transform(key.datasets(), *args, **kwargs)
+
+        @wraps(transform)
+        def memoised(data, *args, **kwargs):
+            return cached(_VersionKey(data), *args, **kwargs)
+        memoised.cache_info = cached.cache_info
+        memoised.cache_clear = cached.cache_clear
+        return memoised
+    return decorate
+
+
+# -----------------------------
+# Tab 1: Overall Trends
+# -----------------------------
+# Rendered from the pre-aggregated monthly_kpis and quarter_hour_profile
+# tables (a few hundred rows) rather than the daily/hourly history.
+@memoise(STATIC_CACHE_SIZE)
+def overall_kpis(data):
+    monthly_kpis = data['monthly_kpis']
+
+    # Precompute yearly aggregates (duration = mean of the daily averages)
+    yearly = monthly_kpis.groupby('year')[['trip_count', 'active_days', 'daily_avg_duration_sum']].sum()
+    yearly['avg_duration_minutes'] = yearly['daily_avg_duration_sum'] / yearly['active_days']
+    yearly_trips = yearly['trip_count'].reset_index()
+    yearly_duration = yearly['avg_duration_minutes'].reset_index()
+
+    # Identify latest full year (one monthly_kpis row per month with trips)
+    months_per_year = monthly_kpis.groupby('year')['month'].nunique()
+    full_years = months_per_year[months_per_year == 12].index.tolist()
+    if len(full_years) > 0:
+        latest_full_year = max(full_years)
+    else:
+        latest_full_year = monthly_kpis['year'].min()  # fallback
+    prev_year = latest_full_year - 1
+
+    # Trips last full year + % change from previous full year
+    trips_last_year = yearly_trips.loc[yearly_trips['year'] == latest_full_year, 'trip_count'].values[0]
+    trips_prev_year = yearly_trips.loc[yearly_trips['year'] == prev_year, 'trip_count'].values[0] if prev_year in yearly_trips['year'].values else None
+    trips_change = (trips_last_year - trips_prev_year) / trips_prev_year * 100 if trips_prev_year else None
+
+    # Latest full year duration + change from previous full year
+    latest_duration = yearly_duration.loc[yearly_duration['year'] == latest_full_year, 'avg_duration_minutes'].values[0]
+    prev_duration = yearly_duration.loc[yearly_duration['year'] == prev_year, 'avg_duration_minutes'].values[0] if prev_year in yearly_duration['year'].values else None
+    duration_change = (latest_duration - prev_duration) if prev_duration else None
+
+    # Year with max trips, year with max average duration
+    year_max_trips_row = yearly_trips.loc[yearly_trips['trip_count'].idxmax()]
+    year_max_duration_row = yearly_duration.loc[yearly_duration['avg_duration_minutes'].idxmax()]
+
+    return {
+        'latest_full_year': latest_full_year,
+        'avg_trips_per_year': yearly_trips['trip_count'].mean(),
+        'trips_last_year': trips_last_year,
+        'trips_change': trips_change,
+        'avg_duration': monthly_kpis['daily_avg_duration_sum'].sum() / monthly_kpis['active_days'].sum(),
+        'latest_duration': latest_duration,
+        'duration_change': duration_change,
+        'year_max_trips': year_max_trips_row['year'],
+        'total_trips_max_year': year_max_trips_row['trip_count'],
+        'max_avg_duration': year_max_duration_row['avg_duration_minutes'],
+        'year_max_avg_duration': year_max_duration_row['year'],
+    }
+
+
+@memoise(STATIC_CACHE_SIZE)
+def monthly_trend(data):
+    """Monthly trips for the last 5 years with each year's monthly average."""
+    monthly_df = data['monthly_kpis'][['year', 'month', 'trip_count']]
+
+    # Keep only the last 5 years
+    last_5_years = sorted(monthly_df['year'].unique())[-5:]
+    monthly_df = monthly_df[monthly_df['year'].isin(last_5_years)].sort_values(['year', 'month'])
+
+    # Compute monthly average per year
+    yearly_avg_df = (
+        monthly_df.groupby('year', as_index=False)['trip_count']
+        .mean()
+        .rename(columns={'trip_count': 'monthly_avg'})
+    )
+    monthly_df = monthly_df.merge(yearly_avg_df, on='year', how='left')
+
+    # Create a combined period column for x-axis
+    monthly_df['period'] = pd.to_datetime(
+        monthly_df['year'].astype(str) + '-' + monthly_df['month'].astype(str) + '-01'
+    )
+
+    # Convert year to string so Plotly uses distinct colors
+    monthly_df['year'] = monthly_df['year'].astype(str)
+    return monthly_df
+
+
+@memoise(STATIC_CACHE_SIZE)
+def quarter_hour_profile(data):
+    """Average hourly trip count per quarter, with all 4 x 24 combinations present."""
+    all_combos = pd.MultiIndex.from_product([range(1, 5), range(24)], names=['quarter', 'trip_hour'])
+    hourly_qtr_agg = (
+        data['quarter_hour_profile'][['quarter', 'trip_hour', 'trip_count']]
+        .set_index(['quarter', 'trip_hour']).reindex(all_combos).reset_index()
+    )
+    hourly_qtr_agg['trip_count'] = hourly_qtr_agg['trip_count'].fillna(0)
+    return hourly_qtr_agg
+
+
+# -----------------------------
+# Tab 2: Stations & Routes
+# -----------------------------
+@memoise(STATIC_CACHE_SIZE)
+def station_kpis(data):
+    top_stations_df = data['top_stations']
+    station_dim = data['station_dim']
+
+    # Exclude stations without docks
+    station_metrics = station_dim[station_dim['docks_count'] > 0].copy()
+
+    # Compute inflow + outflow per station and merge with station_dim for docks info
+    station_traffic = top_stations_df.groupby('station_name', observed=True)[['trips_started', 'trips_ended']].sum()
+    station_traffic['total_trips'] = station_traffic['trips_started'] + station_traffic['trips_ended']
+    station_metrics = station_metrics.merge(
+        station_traffic[['total_trips']],
+        on='station_name',
+        how='left'
+    ).fillna(0)
+
+    # Top area (by total trips)
+    top_area_row = top_stations_df.groupby('station_area', observed=True)[['trips_started', 'trips_ended']].sum()
+    top_area_row['total_trips'] = top_area_row['trips_started'] + top_area_row['trips_ended']
+
+    # Top station by average daily trips (only stations with docks)
+    num_years = top_stations_df['year'].nunique()
+    station_metrics['avg_daily_trips'] = station_metrics['total_trips'] / (num_years * 365)
+    top_station_row = station_metrics.loc[station_metrics['avg_daily_trips'].idxmax()]
+
+    return {
+        'total_stations': station_metrics['station_name'].nunique(),
+        'total_docks': station_metrics['docks_count'].sum(),
+        'avg_docks_per_station': station_metrics['docks_count'].mean(),
+        'top_area': top_area_row['total_trips'].idxmax(),
+        'top_station_name': top_station_row['station_name'],
+        'avg_trip_per_day_top_station': top_station_row['avg_daily_trips'],
+    }
+
+
+@memoise(STATIC_CACHE_SIZE)
+def station_daily_traffic(data):
+    """Inflow + outflow per station across all months/years, averaged per day."""
+    monthly_kpis = data['monthly_kpis']
+    top_stations_agg = (
+        data['top_stations'].groupby('station_name', observed=True)[['trips_started', 'trips_ended']]
+        .sum().reset_index()
+    )
+    top_stations_agg['station_name'] = top_stations_agg['station_name'].astype(str)
+    top_stations_agg['total_traffic'] = top_stations_agg['trips_started'] + top_stations_agg['trips_ended']
+
+    num_days = (monthly_kpis['last_date'].max() - monthly_kpis['first_date'].min()).days + 1
+
+    top_stations_agg['avg_daily_traffic'] = top_stations_agg['total_traffic'] / num_days
+    return top_stations_agg
+
+
+@memoise(WIDGET_CACHE_SIZE)
+def top_traffic_stations(data, top_n):
+    return station_daily_traffic(data).nlargest(top_n, 'avg_daily_traffic')
+
+
+@memoise(STATIC_CACHE_SIZE)
+def station_network(data):
+    """One row per station (top_stations is per station per month) with all-time totals."""
+    return station_totals(data['top_stations'])
+
+
+@memoise(STATIC_CACHE_SIZE)
+def station_grid(data):
+    """Spatial grid index over station_network rows, built once per version."""
+    stations = station_network(data)
+    return GridIndex(stations['latitude'], stations['longitude'])
+
+
+@memoise(WIDGET_CACHE_SIZE)
+def network_clusters(data, zoom):
+    """Whole station network grid-clustered for a map zoom level."""
+    return cluster_stations(station_network(data), zoom)
+
+
+@memoise(WIDGET_CACHE_SIZE)
+def tourist_spot_stations(data, radius_m):
+    """Tourist spots with the count and nearest stations within radius_m."""
+    stations = station_network(data)
+    grid = station_grid(data)
+
+    station_count, nearest = [], []
+    for lat, lon in zip(TOURIST_SPOTS['latitude'], TOURIST_SPOTS['longitude']):
+        positions, distances = grid.within(lat, lon, radius_m)
+        station_count.append(len(positions))
+        nearest.append(", ".join(
+            f"{name} ({dist:.0f} m)"
+            for name, dist in zip(stations['station_name'].to_numpy()[positions[:3]], distances[:3])
+        ))
+    return TOURIST_SPOTS.assign(station_count=station_count, nearest_stations=nearest)
+
+
+@memoise(WIDGET_CACHE_SIZE)
+def tourist_catchments(data, radius_m):
+    """Precomputed tourist spot catchments for one radius, busiest first."""
+    catchments = data['tourist_catchments']
+    return catchments[catchments['radius_m'] == radius_m].sort_values('total_trips', ascending=False)
+
+
+@memoise(WIDGET_CACHE_SIZE)
+def top_area_stations(data, top_area_n):
+    """
+    Top N areas by total trips (lettered A, B, ...) and their top 5 stations.
+    Returns (area_agg, stations_in_top_areas).
+    """
+    stations = station_network(data)
+
+    area_agg = (
+        stations.groupby('station_area', observed=True)['total_trips'].sum().reset_index()
+        .sort_values('total_trips', ascending=False)
+        .head(top_area_n)
+    )
+    area_agg['area_letter'] = [chr(65+i) for i in range(len(area_agg))]
+
+    # Keep only top 5 stations per area
+    stations_in_top_areas = stations[stations['station_area'].isin(area_agg['station_area'])]
+    stations_in_top_areas = stations_in_top_areas.sort_values(['station_area', 'total_trips'], ascending=[True, False])
+    stations_in_top_areas = stations_in_top_areas.groupby('station_area', observed=True).head(5)
+    stations_in_top_areas = stations_in_top_areas.assign(area_letter=stations_in_top_areas['station_area'].map(
+        dict(zip(area_agg['station_area'], area_agg['area_letter']))
+    ))
+    return area_agg, stations_in_top_areas
+
+
+@memoise(STATIC_CACHE_SIZE)
+def route_heatmap_index(data):
+    """
+    {(year_month, hour): start x end pivot} from the precomputed
+    route_heatmap_topk table (year_month 0 = all 12 months), built once per version.
+    """
+    return {
+        key: group.pivot(index='start_station_name', columns='end_station_name', values='trip_count').fillna(0)
+        for key, group in data['route_heatmap_topk'].groupby(['year_month', 'trip_hour'], observed=True)
+    }
+
+
+def route_heatmap(data, hour, year_month=0):
+    """Top start x end station trip counts for one hour: a dictionary lookup."""
+    return route_heatmap_index(data).get((year_month, hour), pd.DataFrame())
+
+
+@memoise(STATIC_CACHE_SIZE)
+def od_matrices(data):
+    """
+    Sparse (year_month, hour) start x end ODMatrices: the ones shipped with
+    the snapshot, else built once per version from route_popularity.
+    """
+    od = data.frames.get('od_matrices')
+    return od if od is not None else build_od_matrices(data['route_popularity'])
+
+
+def route_year_months(data):
+    """Sorted year*100 + month values with route trips."""
+    return od_matrices(data).year_months
+
+
+@memoise(WIDGET_CACHE_SIZE)
+def top_routes(data, hour, top_n, ym_key=None):
+    """Busiest start -> end routes at one hour, for a month or the last 12 months (None)."""
+    ym_list = route_year_months(data)
+    months = ym_list[-12:] if ym_key is None else [ym_key]
+    return od_matrices(data).top_routes(top_n, year_months=months, hours=[hour])
+
+
+@memoise(STATIC_CACHE_SIZE)
+def flow_cube(data):
+    """
+    Station x day x hour in/out FlowCube: the memory-mapped one shipped with
+    the snapshot, else built once per version from route_popularity.
+    """
+    cube = data.frames.get('flow_cube')
+    return cube if cube is not None else build_flow_cube(data['route_popularity'])
+
+
+def _last_months_range(data, ym_key=None):
+    # (first_date, last_date) of ym_key, or of the last 12 months when None
+    ym_list = route_year_months(data)
+    months = ym_list[-12:] if ym_key is None else [ym_key]
+    return month_bounds(months[0])[0], month_bounds(months[-1])[1]
+
+
+@memoise(WIDGET_CACHE_SIZE)
+def least_utilised_stations(data, bottom_n=10):
+    """Stations with docks and the lowest inflow + outflow over the last 12 months."""
+    od = od_matrices(data)
+    outflow, inflow = od.marginals(year_months=route_year_months(data)[-12:])
+
+    station_usage = pd.DataFrame({
+        'station_name': od.station_names,
+        'inflow': inflow,
+        'outflow': outflow,
+    })
+    station_usage['total_traffic'] = station_usage['inflow'] + station_usage['outflow']
+    station_usage = station_usage[station_usage['total_traffic'] > 0]
+
+    # Exclude stations with 0 docks
+    station_usage = station_usage.merge(
+        data['station_dim'][['station_name', 'docks_count']],
+        on='station_name',
+        how='left'
+    )
+    station_usage = station_usage[station_usage['docks_count'] > 0]
+    return station_usage.nsmallest(bottom_n, 'total_traffic')
+
+
+# -----------------------------
+# Tab 3: Trip Duration & Return
+# -----------------------------
+@memoise(STATIC_CACHE_SIZE)
+def duration_histograms(data):
+    """(years, bins, counts per year x bin) from trip_duration_histogram."""
+    return year_histograms(data['trip_duration_histogram'])
+
+
+@memoise(STATIC_CACHE_SIZE)
+def duration_summary(data):
+    """
+    Duration metrics from trip_duration_histogram by cumulative sums over the
+    1-minute bins: exact per-trip shares and medians, overall and per year.
+    """
+    duration_df = data['trip_duration_histogram']
+    hist_years, hist_bins, hist_counts = duration_histograms(data)
+    all_years_counts = hist_counts.sum(axis=0)
+
+    # Latest full year = latest year with all 12 months, else the latest year (partial snapshots)
+    year_counts = duration_df.groupby('year')['month'].nunique()
+    full_years = year_counts[year_counts == 12].index
+    latest_full_year = full_years.max() if len(full_years) > 0 else year_counts.index.max()
+    prev_full_year = latest_full_year - 1
+
+    # Per-year shares and medians in one pass over the cumulative counts
+    pct_below_30_by_year = dict(zip(hist_years, share_at_most(hist_bins, hist_counts, 30)))
+    median_by_year = dict(zip(hist_years, median_minutes(hist_bins, hist_counts)))
+
+    pct_above_30_latest = 100 - pct_below_30_by_year[latest_full_year]
+    pct_above_30_prev = 100 - pct_below_30_by_year.get(prev_full_year, np.nan)
+
+    return {
+        'years': hist_years,
+        'latest_full_year': latest_full_year,
+        'pct_below_30': share_at_most(hist_bins, all_years_counts, 30),
+        'pct_above_30_latest': pct_above_30_latest,
+        'pct_above_30_change': pct_above_30_latest - pct_above_30_prev,
+        'median_all_years': median_minutes(hist_bins, all_years_counts),
+        'median_latest_year': median_by_year[latest_full_year],
+    }
+
+
+DURATION_BAND_EDGES = [0, 5, 15, 30, 45, 60, float('inf')]
+DURATION_BAND_LABELS = ['Under 5 min', '5-15 min', '15-30 min', '30-45 min', '45-60 min', 'Over 60 min']
+
+
+@memoise(WIDGET_CACHE_SIZE)
+def duration_bands(data, selected_year):
+    """Trip count and % per duration band for one year ("All" = every year)."""
+    hist_years, hist_bins, hist_counts = duration_histograms(data)
+    if selected_year != "All":
+        band_hist_counts = hist_counts[list(hist_years).index(int(selected_year))]
+    else:
+        band_hist_counts = hist_counts.sum(axis=0)
+
+    duration_band_df = pd.DataFrame({
+        'duration_band': DURATION_BAND_LABELS,
+        'trip_count': band_counts(hist_bins, band_hist_counts, DURATION_BAND_EDGES)
+    })
+    duration_band_df['pct'] = (duration_band_df['trip_count'] / duration_band_df['trip_count'].sum() * 100).round(1)
+    return duration_band_df
+
+
+@memoise(STATIC_CACHE_SIZE)
+def violin_stats(data, max_minutes=60, max_points=500):
+    """Server-side density, box statistics and a bounded point sample for the violin."""
+    bins, counts = histogram_counts(data['trip_duration_histogram'], max_minutes=max_minutes)
+    grid = np.linspace(0, max_minutes, 4 * max_minutes + 1)
+    density = kde_from_histogram(bins, counts, grid)
+    q1, median, q3 = weighted_quantiles(bins, counts, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    return {
+        'grid': grid,
+        'density': density,
+        'q1': q1,
+        'median': median,
+        'q3': q3,
+        'lowerfence': max(bins.min(), q1 - 1.5 * iqr),
+        'upperfence': min(bins.max(), q3 + 1.5 * iqr),
+        'mean': weighted_mean(bins, counts),
+        'sample': sample_points(bins, counts, max_points=max_points),
+    }
+
+
+@memoise(STATIC_CACHE_SIZE)
+def hourly_avg_duration(data):
+    """Trip-weighted average duration per hour of day from the histogram."""
+    duration_df = data['trip_duration_histogram']
+    hourly_hist = duration_df[['trip_hour', 'trip_count']].assign(
+        duration_total=duration_df['duration_minutes_bin'] * duration_df['trip_count']
+    ).groupby('trip_hour')[['duration_total', 'trip_count']].sum()
+    return (hourly_hist['duration_total'] / hourly_hist['trip_count']).reset_index(name='duration_min')
+
+
+# -----------------------------
+# Tab 4: Supply & Net Inflow
+# -----------------------------
+@memoise(WIDGET_CACHE_SIZE)
+def station_utilisation(data, ym_key, hour):
+    """
+    Average hourly inflow/outflow/net per station at one hour, per dock.
+    ym_key is a year*100+month value, or None for the last 12 months.
+    """
+    cube = flow_cube(data)
+    start, end = _last_months_range(data, ym_key)
+    flows = cube.select(start=start, end=end, hour=hour)    # (stations, days, in/out) view
+
+    # Average over the days each station saw any trip at the selected hour
+    active_days = (flows.sum(axis=2) > 0).sum(axis=1)
+    totals = flows.sum(axis=1, dtype=np.int64)
+    active = active_days > 0
+    inflow = totals[active, IN] / active_days[active]
+    outflow = totals[active, OUT] / active_days[active]
+    station_metrics = pd.DataFrame({
+        'station_name': cube.station_names[active],
+        'avg_hourly_inflow': inflow,
+        'avg_hourly_outflow': outflow,
+        'avg_hourly_net': inflow - outflow,
+    })
+
+    # Exclude stations with 0 docks
+    station_dim = data['station_dim']
+    station_metrics = station_metrics.merge(
+        station_dim[['station_name', 'docks_count']],
+        on='station_name', how='left'
+    )
+    station_metrics = station_metrics[station_metrics['docks_count'] > 0].copy()
+
+    # Utilization per dock
+    station_metrics['utilization_net'] = station_metrics['avg_hourly_net'] / station_metrics['docks_count']
+    station_metrics['utilization_inflow'] = station_metrics['avg_hourly_inflow'] / station_metrics['docks_count']
+    station_metrics['utilization_outflow'] = station_metrics['avg_hourly_outflow'] / station_metrics['docks_count']
+    station_metrics['utilization_total'] = (
+        station_metrics['avg_hourly_inflow'] + station_metrics['avg_hourly_outflow']
+    ) / station_metrics['docks_count']
+
+    # Preformatted "<name> (<docks> docks)" label
+    station_metrics['station_label'] = station_labels(station_dim, station_metrics['station_name'])
+    return station_metrics
+
+
+@memoise(WIDGET_CACHE_SIZE)
+def top_net_utilisation(data, ym_key, hour, top_n):
+    station_metrics = station_utilisation(data, ym_key, hour)
+    return station_metrics.reindex(
+        station_metrics['utilization_net'].abs().sort_values(ascending=False).index
+    ).head(top_n)
+
+
+@memoise(WIDGET_CACHE_SIZE)
+def net_utilisation_forecast(data, ym_key, hour, top_n):
+    """
+    Next-day forecast net flow per dock at one hour for the stations in
+    top_net_utilisation, in the same order (NaN where no forecast exists).
+    """
+    forecast_df = data['station_demand_forecast']
+    forecast_df = forecast_df[forecast_df['trip_hour'] == hour]
+    top_imbalance = top_net_utilisation(data, ym_key, hour, top_n)
+
+    forecast_top = top_imbalance[['station_name', 'station_label', 'docks_count']].merge(
+        forecast_df[['station_name', 'forecast_date', 'forecast_starts', 'forecast_ends']],
+        on='station_name', how='left'
+    )
+    forecast_top['forecast_net_per_dock'] = (
+        forecast_top['forecast_ends'] - forecast_top['forecast_starts']
+    ) / forecast_top['docks_count']
+    return forecast_top
+
+
+@memoise(WIDGET_CACHE_SIZE)
+def top_total_utilisation(data, ym_key, hour, top_n):
+    return station_utilisation(data, ym_key, hour).nlargest(top_n, 'utilization_total')
+
+
+@memoise(WIDGET_CACHE_SIZE)
+def top_rebalanced_stations(data, ym_key, hour, top_n):
+    """
+    Stations with the largest inferred operator moves at one hour: bikes
+    added/removed summed over the month (ym_key) or the last 12 months (None),
+    from the month x hour x station rebalancing_monthly table.
+    """
+    moves_df = data['rebalancing_monthly']
+    moves_year_month = moves_df['year'].astype('int32')*100 + moves_df['month']
+    ym_list = route_year_months(data)
+    months = ym_list[-12:] if ym_key is None else [ym_key]
+    moves_df = moves_df[moves_year_month.isin(months) & (moves_df['move_hour'] == hour)]
+
+    station_moves = moves_df.groupby('station_name', observed=True)[
+        ['bikes_added', 'bikes_removed', 'net_rebalanced']
+    ].sum().reset_index()
+    station_moves = station_moves.reindex(
+        station_moves['net_rebalanced'].abs().sort_values(ascending=False).index
+    ).head(top_n)
+    return station_moves.assign(station_label=station_labels(data['station_dim'], station_moves['station_name']))
@@ -0,0 +1,47 @@
+import math
+
+# -----------------------------
+# Distinct bikes per station and period
+# -----------------------------
+# The analytics build keeps one BigQuery HyperLogLog++ sketch of bike_id per
+# station per day (HLL_COUNT.INIT, a few hundred bytes each). Sketches merge
+# across any date range and station group with HLL_COUNT.MERGE, so "distinct
+# bikes at these stations last quarter" reads the sketch table instead of
+# running COUNT(DISTINCT bike_id) over fact_trips.
+#
+# Error bound: with precision p the estimate's relative standard error is
+# about 1.04 / sqrt(2**p); p = 14 gives ~0.8% (within ~1.6% for 95% of
+# queries). Small counts use HLL++'s sparse, higher-precision representation,
+# so per-station counts are usually tighter than that.
+HLL_PRECISION = 14
+
+
+def relative_error(precision=HLL_PRECISION):
+    """Relative standard error of an HLL++ count at the given precision."""
+    return 1.04 / math.sqrt(2 ** precision)
+
+
+def distinct_bikes_sql(sketch_table, start, end, station_ids=None, group_by=None):
+    """
+    Query merging station_bike_sketches rows over [start, end] (inclusive
+    dates), optionally for a station group, into a distinct_bikes estimate.
+    group_by: None (one row) or sketch table columns to break the estimate
+    down by, e.g. ["station_id"].
+    """
+    station_filter = "" if not station_ids else \
+        f"AND station_id IN ({', '.join(str(int(s)) for s in station_ids)})"
+    select_keys = "".join(f"{column}, " for column in group_by or [])
+    group_clause = "" if not group_by else "GROUP BY " + ", ".join(group_by)
+    return f"""
+SELECT {select_keys}HLL_COUNT.MERGE(bikes_sketch) AS distinct_bikes
+FROM `{sketch_table}`
+WHERE date BETWEEN DATE '{start}' AND DATE '{end}'
+  {station_filter}
+{group_clause}
+"""
+
+
+def distinct_bikes(budget, sketch_table, start, end, station_ids=None):
+    """Estimated distinct bikes at station_ids (None = all) between start and end."""
+    rows = list(budget.query(distinct_bikes_sql(sketch_table, start, end, station_ids)).result())
+    return (rows[0].distinct_bikes or 0) if rows else 0
@@ -0,0 +1,104 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Compact dtype schema for the LondonBicycles_Analytics tables
+# -----------------------------
+# Names repeat across thousands of rows -> categoricals.
+# Calendar parts and hours fit in int8/int16, counts in int32, averages in float32.
+COLUMN_DTYPES = {
+    # Station / band labels
+    "station_name": "category",
+    "start_station_name": "category",
+    "end_station_name": "category",
+    "station_area": "category",
+    "start_station_area": "category",
+    "end_station_area": "category",
+    "duration_band": "category",
+    # Calendar parts and hours
+    "year": "int16",
+    "month": "int8",
+    "day": "int8",
+    "week": "int8",
+    "weekday": "int8",
+    "quarter": "int8",
+    "trip_hour": "int8",
+    "move_hour": "int8",
+    "duration_minutes_bin": "int16",
+    "year_month": "int32",
+    "start_rank": "int8",
+    "end_rank": "int8",
+    "docks_count": "int16",
+    "radius_m": "int16",
+    "poi_number": "int8",
+    # Counts
+    "trip_count": "int32",
+    "trips_started": "int32",
+    "trips_ended": "int32",
+    "net_inflow": "int32",
+    "bikes_removed": "int32",
+    "bikes_added": "int32",
+    "net_rebalanced": "int32",
+    "same_station_trips": "int32",
+    "total_trips": "int32",
+    "station_count": "int16",
+    "active_days": "int8",
+    # Averages and ratios
+    "avg_duration_minutes": "float32",
+    "daily_avg_duration_sum": "float32",
+    "min_duration_minutes": "float32",
+    "max_duration_minutes": "float32",
+    "avg_duration_from_station": "float32",
+    "avg_duration_to_station": "float32",
+    "pct_of_total": "float32",
+    "pct_same_station_trips": "float32",
+    "inflow_ratio_per_dock": "float32",
+    "avg_distance_m": "float32",
+    "forecast_starts": "float32",
+    "forecast_ends": "float32",
+}
+
+# Per-table overrides of COLUMN_DTYPES (None = leave the column as loaded)
+TABLE_DTYPES = {
+    # station_static is small and its names feed string formatting
+    "station_static": {"station_name": None},
+    # Average trips per hour, not a count
+    "quarter_hour_profile": {"trip_count": "float32"},
+}
+
+
+def table_schema(table_name):
+    """Column -> dtype mapping applied to one analytics table."""
+    schema = dict(COLUMN_DTYPES)
+    schema.update(TABLE_DTYPES.get(table_name, {}))
+    return {col: dtype for col, dtype in schema.items() if dtype is not None}
+
+
+def _target_dtype(series, dtype):
+    # Integer columns with missing values need the nullable pandas dtype
+    if dtype.startswith("int") and series.isna().any():
+        return dtype.capitalize()
+    return dtype
+
+
+def compact_dtypes(df, table_name):
+    """
+    Cast a freshly loaded table to the compact schema and log the memory saved.
+    Columns not in the schema are left untouched.
+    """
+    before = df.memory_usage(deep=True).sum()
+
+    casts = {
+        col: _target_dtype(df[col], dtype)
+        for col, dtype in table_schema(table_name).items()
+        if col in df.columns
+    }
+    df = df.astype(casts)
+
+    after = df.memory_usage(deep=True).sum()
+    logger.info(
+        "%s: %d rows, %.1f MB -> %.1f MB after dtype compaction",
+        table_name, len(df), before / 1e6, after / 1e6,
+    )
+    return df
@@ -0,0 +1,100 @@
+import numpy as np
+
+# -----------------------------
+# Trip duration distribution from trip_duration_histogram
+# -----------------------------
+# The histogram holds trip counts per 1-minute duration bin (ROUND(duration/60)),
+# so the full distribution of every trip is available without per-trip rows.
+
+
+def histogram_counts(hist_df, max_minutes=None):
+    """Collapse histogram rows to (bins, counts) arrays sorted by duration bin."""
+    if max_minutes is not None:
+        hist_df = hist_df[hist_df['duration_minutes_bin'] <= max_minutes]
+    binned = hist_df.groupby('duration_minutes_bin')['trip_count'].sum().sort_index()
+    return binned.index.to_numpy(dtype='float64'), binned.to_numpy(dtype='float64')
+
+
+def weighted_quantiles(bins, counts, quantiles):
+    """Quantiles of the binned distribution via the cumulative count."""
+    cum_counts = np.cumsum(counts)
+    targets = np.asarray(quantiles, dtype='float64') * cum_counts[-1]
+    return bins[np.searchsorted(cum_counts, targets, side='left').clip(max=len(bins) - 1)]
+
+
+def weighted_mean(bins, counts):
+    return float(np.dot(bins, counts) / counts.sum())
+
+
+def kde_from_histogram(bins, counts, grid, bandwidth=None):
+    """
+    Gaussian kernel density of the binned trips evaluated on grid.
+    Bandwidth defaults to Silverman's rule using the weighted std and trip count.
+    """
+    total = counts.sum()
+    if bandwidth is None:
+        mean = np.dot(bins, counts) / total
+        std = np.sqrt(np.dot(counts, (bins - mean) ** 2) / total)
+        bandwidth = max(1.06 * std * total ** (-1 / 5), 0.5)  # never narrower than half a bin
+
+    z = (grid[:, None] - bins[None, :]) / bandwidth
+    kernel = np.exp(-0.5 * z ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    return kernel @ (counts / total)
+
+
+def sample_points(bins, counts, max_points=500, seed=0):
+    """
+    Fixed-size random sample of trip durations drawn from the histogram.
+    Equivalent to a reservoir sample over the raw trips (at 1-minute resolution),
+    so the number of plotted points stays constant however much history there is.
+    """
+    rng = np.random.default_rng(seed)
+    size = int(min(max_points, counts.sum()))
+    sampled = rng.choice(bins, size=size, p=counts / counts.sum())
+    # Spread points across their 1-minute bin so they do not stack on integers
+    return sampled + rng.uniform(-0.5, 0.5, size=size)
+
+
+# -----------------------------
+# Exact statistics by cumulative sums over the bins
+# -----------------------------
+def year_histograms(hist_df):
+    """
+    One histogram row per year: returns (years, bins, counts) where counts has
+    shape (len(years), len(bins)). Sum the rows to get the all-years histogram.
+    """
+    matrix = hist_df.pivot_table(
+        index='year', columns='duration_minutes_bin', values='trip_count',
+        aggfunc='sum', fill_value=0, observed=True
+    ).sort_index().sort_index(axis=1)
+    return (
+        matrix.index.to_numpy(),
+        matrix.columns.to_numpy(dtype='float64'),
+        matrix.to_numpy(dtype='float64'),
+    )
+
+
+def share_at_most(bins, counts, minutes):
+    """% of trips with duration bin <= minutes (counts may be 1-D or one row per group)."""
+    cum_counts = np.cumsum(counts, axis=-1)
+    idx = np.searchsorted(bins, minutes, side='right') - 1
+    below = cum_counts[..., idx] if idx >= 0 else np.zeros(cum_counts.shape[:-1])
+    return below / cum_counts[..., -1] * 100
+
+
+def median_minutes(bins, counts):
+    """Median duration bin (counts may be 1-D or one row per group)."""
+    cum_counts = np.cumsum(np.atleast_2d(counts), axis=-1)
+    medians = np.array([
+        bins[np.searchsorted(row, row[-1] / 2, side='left')] for row in cum_counts
+    ])
+    return medians if np.ndim(counts) > 1 else medians[0]
+
+
+def band_counts(bins, counts, edges):
+    """
+    Trip counts per band (edges[i], edges[i+1]], read off the cumulative counts
+    at each edge, like pd.cut(..., right=True) over the raw durations.
+    """
+    cum_counts = np.concatenate([[0], np.cumsum(counts)])
+    return np.diff(cum_counts[np.searchsorted(bins, edges, side='right')])
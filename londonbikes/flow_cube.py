@@ -0,0 +1,136 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# Dense station x day x hour flow store
+# -----------------------------
+# counts[station, day, hour, direction] holds int32 trip counts, direction
+# IN (trips ending at the station) or OUT (trips starting there). Stations
+# are ordered by area, then name, so an area is a contiguous block of the
+# station axis. Saved next to the snapshot tables as a .npy file plus a
+# JSON index map, and memory-mapped read-only by the dashboard.
+IN, OUT = 0, 1
+CUBE_FILE = "flow_cube.npy"
+INDEX_FILE = "flow_cube_index.json"
+
+
+def _station_area(name):
+    return name.split(",", 1)[1].strip() if "," in name else ""
+
+
+class FlowCube:
+    """
+    Station x day x hour x {in, out} counts with station and date index maps.
+
+    select() returns NumPy views for station slices/areas, date ranges and
+    hours, so reductions read the shared (memory-mapped) pages directly.
+    """
+
+    def __init__(self, counts, station_names, start_date):
+        self.counts = counts
+        self.station_names = np.asarray(station_names, dtype=object)
+        self.station_index = {name: i for i, name in enumerate(self.station_names)}
+        self.start_date = np.datetime64(start_date, "D")
+        self.dates = self.start_date + np.arange(counts.shape[1])
+
+    # -- index maps --
+    def station_positions(self, names):
+        """Positions of station names on the station axis (-1 if unknown)."""
+        return np.array([self.station_index.get(name, -1) for name in names], dtype=np.int64)
+
+    def area_slice(self, area):
+        """Contiguous station-axis slice holding every station of an area."""
+        positions = np.flatnonzero([_station_area(name) == area for name in self.station_names])
+        if not len(positions):
+            return slice(0, 0)
+        return slice(positions[0], positions[-1] + 1)
+
+    def day_slice(self, start=None, end=None):
+        """Day-axis slice for the inclusive date range [start, end]."""
+        first = 0 if start is None else int((np.datetime64(start, "D") - self.start_date).astype(int))
+        last = len(self.dates) if end is None else int((np.datetime64(end, "D") - self.start_date).astype(int)) + 1
+        return slice(min(max(first, 0), len(self.dates)), min(max(last, 0), len(self.dates)))
+
+    # -- slicing --
+    def select(self, stations=None, start=None, end=None, hour=None):
+        """
+        counts[stations, start..end, hour] as a view.
+
+        stations: None (all), a slice, or station names. Names that sit in one
+        contiguous run give a view; any other set is gathered (a copy of just
+        those rows). hour: None (all), an int (drops the hour axis) or a slice.
+        """
+        if stations is None:
+            station_key = slice(None)
+        elif isinstance(stations, slice):
+            station_key = stations
+        else:
+            positions = np.sort(self.station_positions(stations))
+            positions = positions[positions >= 0]
+            if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+                station_key = slice(positions[0], positions[-1] + 1)
+            else:
+                station_key = positions
+        hour_key = slice(None) if hour is None else hour
+
+        if isinstance(station_key, slice):
+            return self.counts[station_key, self.day_slice(start, end), hour_key]
+        return self.counts[:, self.day_slice(start, end), hour_key][station_key]
+
+    # -- persistence --
+    def save(self, directory):
+        """Write counts (.npy) and index maps (.json) into directory."""
+        out = np.lib.format.open_memmap(
+            os.path.join(directory, CUBE_FILE), mode="w+", dtype=np.int32, shape=self.counts.shape
+        )
+        out[:] = self.counts
+        out.flush()
+        with open(os.path.join(directory, INDEX_FILE), "w") as f:
+            json.dump({"stations": list(self.station_names), "start_date": str(self.start_date)}, f)
+
+    @classmethod
+    def load(cls, directory):
+        """Memory-map a saved cube read-only, or None if directory has none."""
+        index_path = os.path.join(directory, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path) as f:
+            index = json.load(f)
+        counts = np.load(os.path.join(directory, CUBE_FILE), mmap_mode="r")
+        return cls(counts, index["stations"], index["start_date"])
+
+
+def build_flow_cube(route_df):
+    """
+    FlowCube from route_popularity rows (year, month, day, trip_hour,
+    start/end_station_name, trip_count): OUT at the start station, IN at
+    the end station.
+    """
+    start_names = route_df["start_station_name"].astype(str).str.strip().to_numpy()
+    end_names = route_df["end_station_name"].astype(str).str.strip().to_numpy()
+    station_names = sorted(set(start_names) | set(end_names), key=lambda name: (_station_area(name), name))
+    station_index = pd.Index(station_names)
+
+    day = pd.to_datetime(pd.DataFrame({
+        "year": route_df["year"].astype("int64"),
+        "month": route_df["month"].astype("int64"),
+        "day": route_df["day"].astype("int64"),
+    })).to_numpy().astype("datetime64[D]")
+    start_date = day.min()
+    day_index = (day - start_date).astype(np.int64)
+
+    counts = np.zeros((len(station_names), int(day_index.max()) + 1, 24, 2), dtype=np.int32)
+    hours = route_df["trip_hour"].to_numpy().astype(np.int64)
+    trips = route_df["trip_count"].to_numpy()
+    np.add.at(counts, (station_index.get_indexer(start_names), day_index, hours, OUT), trips)
+    np.add.at(counts, (station_index.get_indexer(end_names), day_index, hours, IN), trips)
+    return FlowCube(counts, station_names, start_date)
+
+
+def month_bounds(year_month):
+    """First and last date of a year*100+month value."""
+    first = pd.Timestamp(year=int(year_month) // 100, month=int(year_month) % 100, day=1)
+    return first.date(), (first + pd.offsets.MonthEnd(0)).date()
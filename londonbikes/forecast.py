@@ -0,0 +1,137 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from londonbikes.parallel import map_chunks, split, default_workers
+
+# -----------------------------
+# Next-day station demand forecast
+# -----------------------------
+# Every (station, hour, direction) history is one series; all series are
+# fitted together as stacked arrays. For each series
+#   y[t] ~ b0 + b1 * y[t-1] + b2 * y[t-7] + b3 * weekday_baseline[t]
+# where weekday_baseline is the series' mean on that weekday. The ridge
+# least-squares fits are batched through einsum + np.linalg.solve, and
+# series are split across a process pool.
+FEATURES = 4
+RIDGE = 1.0
+MIN_HISTORY_DAYS = 14
+
+FORECAST_COLUMNS = ["station_id", "station_name", "forecast_date", "trip_hour", "forecast_starts", "forecast_ends"]
+
+
+def history_tensor(history):
+    """
+    Dense (stations, days, 24, 2) array of starts/ends from station-hour rows
+    (station_id, date, trip_hour, starts, ends). Days without trips are 0.
+    Nullable (Int64) columns from BigQuery's to_dataframe are fine.
+    Returns (tensor, station_ids, dates).
+    """
+    station_ids, station_index = np.unique(history["station_id"].to_numpy(dtype=np.int64), return_inverse=True)
+    day = pd.to_datetime(history["date"]).to_numpy().astype("datetime64[D]")
+    dates = np.arange(day.min(), day.max() + 1)
+    day_index = (day - dates[0]).astype(np.int64)
+
+    tensor = np.zeros((len(station_ids), len(dates), 24, 2), dtype=np.float32)
+    hours = history["trip_hour"].to_numpy(dtype=np.int64)
+    np.add.at(tensor, (station_index, day_index, hours, 0), history["starts"].to_numpy(dtype=np.float32))
+    np.add.at(tensor, (station_index, day_index, hours, 1), history["ends"].to_numpy(dtype=np.float32))
+    return tensor, station_ids, dates
+
+
+def _design(series, weekday, baseline, t):
+    # Feature rows for target days t (array of day positions)
+    return np.stack([
+        np.ones((len(series), len(t)), dtype=np.float32),
+        series[:, t - 1],
+        series[:, t - 7],
+        baseline[:, weekday[t]],
+    ], axis=-1)
+
+
+def _fit_chunk(chunk):
+    series, weekday, next_weekday, ridge = chunk
+    days = series.shape[1]
+
+    # Weekday baselines: mean of each series per weekday
+    baseline = np.zeros((len(series), 7), dtype=np.float32)
+    for dow in range(7):
+        baseline[:, dow] = series[:, weekday == dow].mean(axis=1)
+
+    t = np.arange(7, days)
+    X = _design(series, weekday, baseline, t)                 # (n, T, k)
+    y = series[:, t]                                           # (n, T)
+    XtX = np.einsum("ntk,ntj->nkj", X, X) + ridge * np.eye(FEATURES, dtype=np.float32)
+    Xty = np.einsum("ntk,nt->nk", X, y)
+    beta = np.linalg.solve(XtX, Xty[..., None])[..., 0]        # (n, k)
+
+    x_next = np.stack([
+        np.ones(len(series), dtype=np.float32),
+        series[:, days - 1],
+        series[:, days - 7],
+        baseline[:, next_weekday],
+    ], axis=-1)
+    return np.clip((x_next * beta).sum(axis=1), 0, None)
+
+
+def fit_forecast(tensor, dates, ridge=RIDGE, workers=None):
+    """
+    Next-day forecast for every station, hour and direction of a
+    (stations, days, 24, 2) history tensor. Returns a (stations, 24, 2) array.
+    """
+    stations, days = tensor.shape[:2]
+    if days < MIN_HISTORY_DAYS:
+        raise ValueError(f"Need at least {MIN_HISTORY_DAYS} days of history, got {days}")
+
+    # (stations * 24 * 2, days): one row per series
+    series = np.ascontiguousarray(tensor.transpose(0, 2, 3, 1).reshape(-1, days))
+    weekday = (dates.astype("datetime64[D]").astype(np.int64) + 3) % 7   # Monday = 0
+    next_weekday = (weekday[-1] + 1) % 7
+
+    workers = workers or default_workers()
+    bounds = split(range(len(series)), workers * 2)
+    chunks = [(series[b[0]:b[-1] + 1], weekday, next_weekday, ridge) for b in bounds if b]
+    forecast = np.concatenate(map_chunks(_fit_chunk, chunks, workers))
+    return forecast.reshape(stations, 24, 2)
+
+
+def forecast_demand(history, station_names=None, ridge=RIDGE, workers=None):
+    """
+    Forecast table for the day after the history ends: one row per station
+    and hour with forecast_starts / forecast_ends. station_names optionally
+    maps station_id -> name. Also returns the fit time in seconds.
+    """
+    tensor, station_ids, dates = history_tensor(history)
+    start = time.perf_counter()
+    forecast = fit_forecast(tensor, dates, ridge=ridge, workers=workers)
+    fit_seconds = time.perf_counter() - start
+
+    forecast_table = pd.DataFrame({
+        "station_id": np.repeat(station_ids, 24),
+        "forecast_date": pd.Timestamp(dates[-1] + 1).date(),
+        "trip_hour": np.tile(np.arange(24), len(station_ids)),
+        "forecast_starts": forecast[:, :, 0].ravel().round(2),
+        "forecast_ends": forecast[:, :, 1].ravel().round(2),
+    })
+    forecast_table["station_name"] = (
+        forecast_table["station_id"].map(station_names) if station_names is not None else None
+    )
+    return forecast_table[FORECAST_COLUMNS], fit_seconds
+
+
+def benchmark(n_stations=1000, days=56, workers=None, seed=0):
+    """Fit seconds per 1,000 stations on synthetic Poisson station-hour history."""
+    rng = np.random.default_rng(seed)
+    rates = rng.gamma(2.0, 1.5, size=(n_stations, 1, 24, 2))
+    tensor = rng.poisson(rates, size=(n_stations, days, 24, 2)).astype(np.float32)
+    dates = np.arange(np.datetime64("2024-01-01"), np.datetime64("2024-01-01") + days)
+
+    start = time.perf_counter()
+    fit_forecast(tensor, dates, workers=workers)
+    return (time.perf_counter() - start) / n_stations * 1000
+
+
+if __name__ == "__main__":
+    seconds = benchmark()
+    print(f"Forecast fit: {seconds:.3f}s per 1,000 stations ({default_workers()} workers)")
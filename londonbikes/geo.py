@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_M = 6_371_000
+# Web Mercator ground resolution at zoom 0 on the equator (metres per pixel)
+METRES_PER_PIXEL_Z0 = 156543.03392
+
+# Top 8 tourist destinations in London
+TOURIST_SPOTS = pd.DataFrame({
+    'name': [
+        'London Eye', 'British Museum', 'Tower of London', 'Buckingham Palace',
+        'Big Ben', 'Trafalgar Square', "St Paul's Cathedral", 'Natural History Museum'
+    ],
+    'latitude': [51.5033, 51.5194, 51.5081, 51.5014, 51.5007, 51.5080, 51.5138, 51.4967],
+    'longitude': [-0.1195, -0.1270, -0.0759, -0.1419, -0.1246, -0.1281, -0.0984, -0.1764]
+})
+TOURIST_SPOTS['number'] = range(1, len(TOURIST_SPOTS)+1)
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres; inputs broadcast like NumPy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype='float64')) for v in (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def _project(latitude, longitude, lat0):
+    # Local equirectangular projection in metres; accurate at city scale
+    x = EARTH_RADIUS_M * np.radians(np.asarray(longitude, dtype='float64')) * np.cos(lat0)
+    y = EARTH_RADIUS_M * np.radians(np.asarray(latitude, dtype='float64'))
+    return x, y
+
+
+# -----------------------------
+# Station aggregation
+# -----------------------------
+def station_totals(top_stations_df):
+    """
+    One row per station from top_stations (which has one row per station per
+    month): static attributes plus trips summed over every month.
+    """
+    totals = top_stations_df.groupby('station_id', as_index=False).agg(
+        station_name=('station_name', 'first'),
+        station_area=('station_area', 'first'),
+        latitude=('latitude', 'first'),
+        longitude=('longitude', 'first'),
+        docks_count=('docks_count', 'first'),
+        trips_started=('trips_started', 'sum'),
+        trips_ended=('trips_ended', 'sum'),
+    )
+    totals['total_trips'] = totals['trips_started'] + totals['trips_ended']
+    return totals
+
+
+# -----------------------------
+# Spatial grid index
+# -----------------------------
+class GridIndex:
+    """
+    Uniform grid over station coordinates for radius queries.
+
+    Points are bucketed into square cells of cell_m metres; a query only
+    measures exact haversine distances to points in the cells the radius
+    overlaps.
+    """
+
+    def __init__(self, latitude, longitude, cell_m=250):
+        self.latitude = np.asarray(latitude, dtype='float64')
+        self.longitude = np.asarray(longitude, dtype='float64')
+        self.cell_m = cell_m
+        self.lat0 = np.radians(self.latitude.mean())
+
+        x, y = _project(self.latitude, self.longitude, self.lat0)
+        cells = pd.DataFrame({'cx': np.floor(x / cell_m).astype('int64'),
+                              'cy': np.floor(y / cell_m).astype('int64')})
+        self._cells = {key: idx.to_numpy() for key, idx in cells.groupby(['cx', 'cy']).groups.items()}
+
+    def within(self, lat, lon, radius_m):
+        """Positions of points within radius_m of (lat, lon) and their distances, nearest first."""
+        x, y = _project(lat, lon, self.lat0)
+        cx, cy = int(np.floor(x / self.cell_m)), int(np.floor(y / self.cell_m))
+        span = int(np.ceil(radius_m / self.cell_m))
+
+        candidates = [
+            self._cells[(cx + i, cy + j)]
+            for i in range(-span, span + 1)
+            for j in range(-span, span + 1)
+            if (cx + i, cy + j) in self._cells
+        ]
+        if not candidates:
+            return np.array([], dtype='int64'), np.array([])
+
+        candidates = np.concatenate(candidates)
+        distances = haversine_m(lat, lon, self.latitude[candidates], self.longitude[candidates])
+        inside = distances <= radius_m
+        order = np.argsort(distances[inside])
+        return candidates[inside][order], distances[inside][order]
+
+
+# -----------------------------
+# Zoom-level clustering
+# -----------------------------
+def cluster_stations(stations, zoom, cluster_px=60):
+    """
+    Grid-cluster stations for a map zoom level: stations whose markers would
+    fall in the same cluster_px x cluster_px screen cell are merged into one
+    trip-weighted cluster. Returns one row per cluster.
+    """
+    lat0 = np.radians(stations['latitude'].mean())
+    cell_m = cluster_px * METRES_PER_PIXEL_Z0 * np.cos(lat0) / 2 ** zoom
+    x, y = _project(stations['latitude'], stations['longitude'], lat0)
+
+    weights = stations['total_trips'].to_numpy(dtype='float64')
+    cells = stations.assign(
+        cx=np.floor(x / cell_m).astype('int64'),
+        cy=np.floor(y / cell_m).astype('int64'),
+        w_lat=stations['latitude'] * weights,
+        w_lon=stations['longitude'] * weights,
+    )
+    grouped = cells.groupby(['cx', 'cy'])
+    clusters = grouped.agg(
+        station_count=('station_id', 'size'),
+        total_trips=('total_trips', 'sum'),
+        w_lat=('w_lat', 'sum'),
+        w_lon=('w_lon', 'sum'),
+        mean_lat=('latitude', 'mean'),
+        mean_lon=('longitude', 'mean'),
+    )
+    # Busiest station names the cluster in hovers
+    clusters['top_station'] = cells.loc[grouped['total_trips'].idxmax(), 'station_name'].to_numpy()
+
+    # Trip-weighted centroid; plain centroid for clusters without trips
+    has_trips = clusters['total_trips'] > 0
+    clusters['latitude'] = np.where(has_trips, clusters['w_lat'] / clusters['total_trips'].where(has_trips, 1), clusters['mean_lat'])
+    clusters['longitude'] = np.where(has_trips, clusters['w_lon'] / clusters['total_trips'].where(has_trips, 1), clusters['mean_lon'])
+    return clusters[['latitude', 'longitude', 'station_count', 'total_trips', 'top_station']].reset_index(drop=True)
+
+
+# -----------------------------
+# Tourist spot catchments
+# -----------------------------
+# Radii (metres) the analytics build precomputes catchments for
+CATCHMENT_RADII_M = (250, 500, 1000)
+
+
+def assign_catchments(stations, pois=TOURIST_SPOTS, radii_m=CATCHMENT_RADII_M):
+    """
+    Assign every station to its nearest point of interest, per radius, when
+    that POI is within the radius. Catchments do not overlap, so their trips
+    add up. Returns one row per (radius_m, station) with poi_number and
+    distance_m.
+    """
+    stations = stations.dropna(subset=['latitude', 'longitude'])
+    # stations x POIs distance matrix in one vectorised pass
+    distances = haversine_m(
+        stations['latitude'].to_numpy()[:, None], stations['longitude'].to_numpy()[:, None],
+        pois['latitude'].to_numpy()[None, :], pois['longitude'].to_numpy()[None, :]
+    )
+    nearest = distances.argmin(axis=1)
+    nearest_m = distances[np.arange(len(stations)), nearest]
+
+    assigned = pd.DataFrame({
+        'station_id': stations['station_id'].to_numpy(),
+        'poi_number': pois['number'].to_numpy()[nearest],
+        'distance_m': nearest_m,
+    })
+    return pd.concat(
+        [assigned[assigned['distance_m'] <= radius].assign(radius_m=radius) for radius in radii_m],
+        ignore_index=True
+    )
+
+
+def catchment_trips(assignments, station_trips, pois=TOURIST_SPOTS, radii_m=CATCHMENT_RADII_M):
+    """
+    Trips started/ended at the stations in each POI catchment.
+    station_trips has one row per station_id with trips_started and
+    trips_ended. Every (radius, POI) pair gets a row, empty catchments
+    included.
+    """
+    joined = assignments.merge(station_trips, on='station_id', how='left')
+    joined[['trips_started', 'trips_ended']] = joined[['trips_started', 'trips_ended']].fillna(0)
+    per_poi = joined.groupby(['radius_m', 'poi_number']).agg(
+        station_count=('station_id', 'size'),
+        trips_started=('trips_started', 'sum'),
+        trips_ended=('trips_ended', 'sum'),
+        avg_distance_m=('distance_m', 'mean'),
+    )
+
+    grid = pd.MultiIndex.from_product([list(radii_m), pois['number']], names=['radius_m', 'poi_number'])
+    per_poi = per_poi.reindex(grid).fillna({'station_count': 0, 'trips_started': 0, 'trips_ended': 0}).reset_index()
+    per_poi = per_poi.astype({'station_count': 'int64', 'trips_started': 'int64', 'trips_ended': 'int64'})
+    per_poi['total_trips'] = per_poi['trips_started'] + per_poi['trips_ended']
+
+    poi_cols = pois.rename(columns={'number': 'poi_number', 'name': 'poi_name'})
+    return per_poi.merge(poi_cols, on='poi_number').sort_values(['radius_m', 'poi_number'])[[
+        'radius_m', 'poi_number', 'poi_name', 'latitude', 'longitude',
+        'station_count', 'trips_started', 'trips_ended', 'total_trips', 'avg_distance_m'
+    ]].reset_index(drop=True)
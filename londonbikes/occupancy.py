@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+from londonbikes.parallel import map_chunks, split, default_workers
+
+# -----------------------------
+# Station occupancy simulation
+# -----------------------------
+# Each station follows one continuous minute-by-minute curve over the whole
+# window: it starts at INITIAL_FILL of its docks on the first day, then each
+# day starts where the previous one ended (days without trips included),
+# always clipped to [0, docks_count]. Clipping is where real operations
+# would have had an empty or full station: the clipped amount is reported
+# as deficit_bikes (departures with no bike to take) and overflow_bikes
+# (arrivals with no free dock).
+MINUTES_PER_DAY = 24 * 60
+INITIAL_FILL = 0.5
+
+OCCUPANCY_COLUMNS = [
+    "station_id", "date", "docks_count", "trips_in", "trips_out",
+    "start_bikes", "end_bikes", "min_bikes", "max_bikes",
+    "empty_minutes", "full_minutes", "deficit_bikes", "overflow_bikes",
+]
+
+
+def _saturate(start, net, docks):
+    """
+    Clipped walk for one day that leaves [0, docks]: cumulative sums from
+    the current level up to the next bound violation, clip, restart there.
+    """
+    occupancy = np.empty(len(net), dtype=np.int32)
+    level, pos, deficit, overflow = start, 0, 0, 0
+    while pos < len(net):
+        run = level + np.cumsum(net[pos:])
+        violations = np.flatnonzero((run < 0) | (run > docks))
+        if not len(violations):
+            occupancy[pos:] = run
+            break
+        hit = violations[0]
+        occupancy[pos:pos + hit] = run[:hit]
+        if run[hit] < 0:
+            deficit -= run[hit]
+            level = 0
+        else:
+            overflow += run[hit] - docks
+            level = docks
+        occupancy[pos + hit] = level
+        pos += hit + 1
+    return occupancy, deficit, overflow
+
+
+def simulate_station(net, docks, initial_fill=INITIAL_FILL):
+    """
+    Occupancy curve for one station: net is a (days, 1440) matrix of
+    arrivals - departures per minute over consecutive days. Returns
+    (occupancy, deficit, overflow) with occupancy shaped like net and
+    per-day clipped totals; each day starts at the previous day's clipped
+    end level, only the first at docks * initial_fill.
+
+    The whole window is cumulated at once; from the first day whose
+    unclipped curve leaves [0, docks], days are walked one at a time
+    through the saturating loop, carrying the level over.
+    """
+    start = int(round(docks * initial_fill))
+    occupancy = (start + np.cumsum(net.ravel(), dtype=np.int64)).reshape(net.shape).astype(np.int32)
+    deficit = np.zeros(len(net), dtype=np.int64)
+    overflow = np.zeros(len(net), dtype=np.int64)
+
+    out_of_bounds = np.flatnonzero((occupancy.min(axis=1) < 0) | (occupancy.max(axis=1) > docks))
+    if not len(out_of_bounds):
+        return occupancy, deficit, overflow
+
+    first = out_of_bounds[0]
+    level = occupancy[first - 1, -1] if first else start
+    for day in range(first, len(net)):
+        day_curve = level + np.cumsum(net[day], dtype=np.int64)
+        if day_curve.min() < 0 or day_curve.max() > docks:
+            occupancy[day], deficit[day], overflow[day] = _saturate(level, net[day], docks)
+        else:
+            occupancy[day] = day_curve
+        level = int(occupancy[day, -1])
+    return occupancy, deficit, overflow
+
+
+def _station_days(dates, day_index, minutes, inflow_events, outflow_events, docks, initial_fill):
+    # dates: every day of the window; day_index positions each event in it
+    inflow = np.zeros((len(dates), MINUTES_PER_DAY), dtype=np.int32)
+    outflow = np.zeros((len(dates), MINUTES_PER_DAY), dtype=np.int32)
+    np.add.at(inflow, (day_index, minutes), inflow_events)
+    np.add.at(outflow, (day_index, minutes), outflow_events)
+
+    occupancy, deficit, overflow = simulate_station(inflow - outflow, docks, initial_fill)
+    start_bikes = np.concatenate([[int(round(docks * initial_fill))], occupancy[:-1, -1]])
+    return pd.DataFrame({
+        "date": dates,
+        "docks_count": docks,
+        "trips_in": inflow.sum(axis=1),
+        "trips_out": outflow.sum(axis=1),
+        "start_bikes": start_bikes,
+        "end_bikes": occupancy[:, -1],
+        "min_bikes": occupancy.min(axis=1),
+        "max_bikes": occupancy.max(axis=1),
+        "empty_minutes": (occupancy == 0).sum(axis=1),
+        "full_minutes": (occupancy == docks).sum(axis=1),
+        "deficit_bikes": deficit,
+        "overflow_bikes": overflow,
+    })
+
+
+def _simulate_chunk(chunk):
+    stations, dates, initial_fill = chunk
+    frames = [
+        _station_days(dates, *arrays, docks, initial_fill).assign(station_id=station_id)
+        for station_id, docks, arrays in stations
+    ]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=OCCUPANCY_COLUMNS)
+
+
+def simulate_occupancy(events, docks_count, initial_fill=INITIAL_FILL, workers=None):
+    """
+    Empty/full minutes per station-day.
+
+    events: station_id, date, minute_of_day (0-1439), inflow, outflow.
+    Nullable (Int64) columns, as returned by BigQuery's to_dataframe, are
+    fine. docks_count: Series of docks indexed by station_id; stations
+    without docks are skipped. Every station is simulated over every day
+    from the first to the last event date. Stations are split across a
+    process pool.
+    """
+    docks_count = docks_count[docks_count > 0]
+    events = events[events["station_id"].isin(docks_count.index)]
+    if events.empty:
+        return pd.DataFrame(columns=OCCUPANCY_COLUMNS)
+
+    day = pd.to_datetime(events["date"]).to_numpy().astype("datetime64[D]")
+    dates = np.arange(day.min(), day.max() + 1)
+    events = events.assign(day_index=(day - dates[0]).astype(np.int64))
+    # Plain int64 arrays per station keep what is pickled to the workers small
+    stations = [
+        (station_id, int(docks_count[station_id]), tuple(
+            station_events[col].to_numpy(dtype=np.int64)
+            for col in ("day_index", "minute_of_day", "inflow", "outflow")
+        ))
+        for station_id, station_events in events.groupby("station_id", sort=True)
+    ]
+
+    workers = workers or default_workers()
+    chunks = [(part, pd.to_datetime(dates).date, initial_fill) for part in split(stations, workers * 4)]
+    results = map_chunks(_simulate_chunk, chunks, workers)
+    return pd.concat(results, ignore_index=True)[OCCUPANCY_COLUMNS]
@@ -0,0 +1,105 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# -----------------------------
+# Sparse origin-destination matrices
+# -----------------------------
+# route_popularity summed to one start x end CSR matrix of trip counts per
+# (year_month, hour), over integer station ids (positions in
+# station_names). The per-key matrices are stacked as row blocks of one
+# CSR matrix, so a single (month, hour) is a cheap row slice and the file
+# on disk is one .npz plus a JSON index. Days are summed away: day-level
+# questions go to the FlowCube instead.
+OD_FILE = "od_matrices.npz"
+OD_INDEX_FILE = "od_matrices_index.json"
+
+
+class ODMatrices:
+    """Stacked (year_month, hour) start x end CSR trip-count matrices."""
+
+    def __init__(self, stacked, station_names, keys):
+        self.stacked = stacked.tocsr()
+        self.station_names = np.asarray(station_names, dtype=object)
+        self.keys = [tuple(int(v) for v in key) for key in keys]
+        self.key_index = {key: i for i, key in enumerate(self.keys)}
+        self.year_months = sorted({year_month for year_month, _ in self.keys})
+
+    def block(self, year_month, hour):
+        """start x end matrix of one (year_month, hour), empty if it has no trips."""
+        n = len(self.station_names)
+        i = self.key_index.get((int(year_month), int(hour)))
+        if i is None:
+            return sparse.csr_matrix((n, n), dtype=self.stacked.dtype)
+        return self.stacked[i * n:(i + 1) * n]
+
+    def matrix(self, year_months=None, hours=None):
+        """start x end trips summed over the given months and hours (None = all)."""
+        n = len(self.station_names)
+        year_months = None if year_months is None else {int(ym) for ym in year_months}
+        hours = None if hours is None else {int(h) for h in hours}
+        total = sparse.csr_matrix((n, n), dtype=np.int64)
+        for year_month, hour in self.keys:
+            if (year_months is None or year_month in year_months) and (hours is None or hour in hours):
+                total = total + self.block(year_month, hour)
+        return total
+
+    def marginals(self, year_months=None, hours=None):
+        """(outflow, inflow) per station: row and column sums of matrix()."""
+        total = self.matrix(year_months, hours)
+        return np.asarray(total.sum(axis=1)).ravel(), np.asarray(total.sum(axis=0)).ravel()
+
+    def top_routes(self, k, year_months=None, hours=None):
+        """The k busiest start -> end pairs: start/end_station_name, trip_count."""
+        total = self.matrix(year_months, hours).tocoo()
+        top = np.argsort(-total.data, kind="stable")[:k]
+        return pd.DataFrame({
+            "start_station_name": self.station_names[total.row[top]],
+            "end_station_name": self.station_names[total.col[top]],
+            "trip_count": total.data[top],
+        })
+
+    # -- persistence --
+    def save(self, directory):
+        sparse.save_npz(os.path.join(directory, OD_FILE), self.stacked)
+        with open(os.path.join(directory, OD_INDEX_FILE), "w") as f:
+            json.dump({"stations": list(self.station_names), "keys": self.keys}, f)
+
+    @classmethod
+    def load(cls, directory):
+        """Saved matrices from directory, or None if it has none."""
+        index_path = os.path.join(directory, OD_INDEX_FILE)
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path) as f:
+            index = json.load(f)
+        return cls(sparse.load_npz(os.path.join(directory, OD_FILE)), index["stations"], index["keys"])
+
+
+def build_od_matrices(route_df):
+    """
+    ODMatrices from route_popularity rows (year, month, trip_hour,
+    start/end_station_name, trip_count).
+    """
+    start_names = route_df["start_station_name"].astype(str).str.strip().to_numpy()
+    end_names = route_df["end_station_name"].astype(str).str.strip().to_numpy()
+    station_index = pd.Index(sorted(set(start_names) | set(end_names)))
+    n = len(station_index)
+
+    year_month = route_df["year"].to_numpy().astype(np.int64) * 100 + route_df["month"].to_numpy().astype(np.int64)
+    keys, key_index = np.unique(
+        np.stack([year_month, route_df["trip_hour"].to_numpy().astype(np.int64)], axis=1),
+        axis=0, return_inverse=True
+    )
+    key_index = key_index.ravel()
+
+    # Row = key block offset + start station; duplicates (days) are summed by tocsr()
+    stacked = sparse.coo_matrix(
+        (route_df["trip_count"].to_numpy().astype(np.int32),
+         (key_index * n + station_index.get_indexer(start_names), station_index.get_indexer(end_names))),
+        shape=(len(keys) * n, n),
+    ).tocsr()
+    return ODMatrices(stacked, list(station_index), keys.tolist())
@@ -0,0 +1,37 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def map_chunks(func, chunks, workers=None):
+    """
+    func applied to every chunk on a process pool, results in chunk order.
+
+    Workers are forked: the analytics build is a plain script, and spawned
+    workers would re-import (and re-run) it. Where fork is unavailable, or
+    with one worker, chunks run in-process.
+    """
+    chunks = list(chunks)
+    workers = min(workers or default_workers(), len(chunks))
+    if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return [func(chunk) for chunk in chunks]
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as pool:
+        return list(pool.map(func, chunks))
+
+
+def split(items, n_chunks):
+    """items split into at most n_chunks contiguous, near-equal chunks."""
+    items = list(items)
+    n_chunks = max(1, min(n_chunks, len(items)))
+    size, extra = divmod(len(items), n_chunks)
+    chunks, start = [], 0
+    for i in range(n_chunks):
+        stop = start + size + (i < extra)
+        chunks.append(items[start:stop])
+        start = stop
+    return chunks
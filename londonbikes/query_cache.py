@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+
+import pyarrow as pa
+
+from londonbikes.store import REPO_ROOT
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Local query result cache
+# -----------------------------
+# Results are stored as Arrow IPC files named by a hash of the normalised SQL
+# and the last-modified time of every table the query reads. The tables come
+# from a (free) dry run, so quoted, unquoted and view-resolved references are
+# all covered. Rebuilding a table changes its modified time and so the key:
+# stale entries are never read, they just age out of the LRU. Queries that
+# read a view or external table (whose modified time does not follow the
+# data), or more tables than the dry run lists, always run uncached. A hit
+# costs a dry run plus one metadata lookup per table, and no warehouse bytes.
+QUERY_CACHE_DIR = os.environ.get(
+    "LONDONBIKES_QUERY_CACHE_DIR", os.path.join(REPO_ROOT, "data", "query_cache")
+)
+QUERY_CACHE_MAX_BYTES = int(os.environ.get("LONDONBIKES_QUERY_CACHE_MB", "1024")) * 1024 * 1024
+
+# BigQuery lists at most this many referenced tables for a job
+MAX_REFERENCED_TABLES = 50
+# Results of these depend on more than the referenced tables
+_NON_DETERMINISTIC = re.compile(
+    r"\b(CURRENT_(DATE|DATETIME|TIME|TIMESTAMP)|RAND|GENERATE_UUID|SESSION_USER)\b\s*\(|INFORMATION_SCHEMA",
+    re.IGNORECASE,
+)
+
+
+def normalise_sql(sql):
+    """SQL with comments removed and whitespace collapsed (literals untouched)."""
+    sql = re.sub(r"/\*.*?\*/", " ", sql, flags=re.DOTALL)
+    sql = re.sub(r"--[^\n]*", " ", sql)
+    return " ".join(sql.split()).rstrip(";").strip()
+
+
+def referenced_tables(client, sql):
+    """Fully qualified ids of the tables sql reads, from a dry run, sorted."""
+    from google.cloud import bigquery
+    job = client.query(sql, job_config=bigquery.QueryJobConfig(dry_run=True, use_query_cache=False))
+    return sorted({f"{ref.project}.{ref.dataset_id}.{ref.table_id}" for ref in job.referenced_tables or []})
+
+
+class QueryCache:
+    """
+    Size-bounded LRU cache of query results on local disk.
+
+    Recency is the file's modification time, refreshed on every hit; once
+    the directory exceeds max_bytes the least recently used results go
+    first. Hit/miss counters are kept per process, see stats().
+    """
+
+    def __init__(self, client, bqstorage_client=None, root=QUERY_CACHE_DIR, max_bytes=QUERY_CACHE_MAX_BYTES):
+        self._client = client
+        self._bqstorage_client = bqstorage_client
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "uncacheable": 0, "evictions": 0, "bytes_saved": 0}
+        os.makedirs(root, exist_ok=True)
+
+    def _key(self, sql):
+        normalised = normalise_sql(sql)
+        if _NON_DETERMINISTIC.search(normalised):
+            return None
+        try:
+            tables = referenced_tables(self._client, sql)
+        except Exception:
+            # Invalid SQL, missing tables, ...: the real run reports the error
+            return None
+        if not tables or len(tables) >= MAX_REFERENCED_TABLES:
+            return None
+
+        digest = hashlib.sha256(normalised.encode())
+        for table_id in tables:
+            try:
+                table = self._client.get_table(table_id)
+            except Exception:
+                return None
+            if table.table_type != "TABLE":
+                # Views, materialized views, external tables: modified does not track the data
+                return None
+            modified = table.modified
+            digest.update(f"\0{table_id}@{modified.isoformat() if modified else ''}".encode())
+        return digest.hexdigest()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith(".arrow"):
+                stat = os.stat(os.path.join(self.root, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                continue
+            total -= size
+            self._count("evictions")
+
+    def query_arrow(self, sql):
+        """Query result as a pa.Table, from the cache when the referenced tables are unchanged."""
+        key = self._key(sql)
+        if key is None:
+            self._count("uncacheable")
+            return self._client.query(sql).to_arrow(bqstorage_client=self._bqstorage_client)
+
+        path = os.path.join(self.root, f"{key}.arrow")
+        try:
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+            os.utime(path)
+            self._count("hits")
+            saved = int((table.schema.metadata or {}).get(b"total_bytes_processed", 0))
+            self._count("bytes_saved", saved)
+            logger.info("Query cache hit %s (%d bytes not billed)", key[:12], saved)
+            return table
+        except FileNotFoundError:
+            pass
+
+        self._count("misses")
+        logger.info("Query cache miss %s", key[:12])
+        job = self._client.query(sql)
+        table = job.to_arrow(bqstorage_client=self._bqstorage_client)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b"total_bytes_processed": str(job.total_bytes_processed or 0).encode(),
+        })
+
+        # Write then rename so concurrent readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+        self._evict()
+        return table
+
+    def query(self, sql):
+        """Query result as a DataFrame; see query_arrow."""
+        return self.query_arrow(sql).to_pandas()
+
+    def stats(self):
+        """Hit/miss counters for this process plus the cache's current size."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["size_bytes"] = sum(
+            os.path.getsize(os.path.join(self.root, name))
+            for name in os.listdir(self.root) if name.endswith(".arrow")
+        )
+        return stats
+
+    def clear(self):
+        for name in os.listdir(self.root):
+            if name.endswith(".arrow"):
+                os.remove(os.path.join(self.root, name))
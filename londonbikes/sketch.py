@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# -----------------------------
+# Mergeable duration sketches
+# -----------------------------
+# DDSketch-style log buckets: a duration x (seconds) falls in bucket
+#   ceil(log(x) / log(GAMMA)),  GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+# and every bucket is read back as 2 * GAMMA**i / (GAMMA + 1), which is
+# within RELATIVE_ACCURACY of any duration in it. A sketch is just bucket
+# counts, so sketches merge by addition and any quantile of the merged
+# counts keeps the same relative error. 1% accuracy covers 1 min - 4 h in
+# ~275 buckets.
+# The analytics build stores one sketch per station x hour x month as
+# (bucket, trip_count) rows; bucket_sql() is the same bucketing in BigQuery.
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+def bucket_of(seconds):
+    """Sketch bucket of each duration in seconds (> 0)."""
+    return np.ceil(np.log(np.asarray(seconds, dtype=np.float64)) / np.log(GAMMA)).astype(np.int64)
+
+
+def bucket_value(bucket):
+    """Representative duration (seconds) of each bucket."""
+    return 2 * GAMMA ** np.asarray(bucket, dtype=np.float64) / (GAMMA + 1)
+
+
+def bucket_sql(column):
+    """BigQuery expression bucketing a duration column the same way as bucket_of."""
+    return f"CAST(CEIL(LN({column}) / LN({GAMMA!r})) AS INT64)"
+
+
+def quantiles(counts, bucket_offset, qs=PERCENTILES):
+    """Durations (seconds) at quantiles qs of dense bucket counts; NaN when empty."""
+    cumulative = np.cumsum(counts)
+    if not len(cumulative) or cumulative[-1] == 0:
+        return np.full(len(qs), np.nan)
+    ranks = np.asarray(qs) * (cumulative[-1] - 1)
+    return bucket_value(bucket_offset + np.searchsorted(cumulative, ranks, side="right"))
+
+
+class DurationSketches:
+    """
+    Station x hour x month duration sketches as rows of one CSR bucket-count
+    matrix. Rows are sorted by station, so one station's sketches are a
+    contiguous block and a roll-up only touches the rows it merges.
+    """
+
+    def __init__(self, station_ids, year_months, hours, counts, bucket_offset):
+        self.station_ids = station_ids
+        self.year_months = year_months
+        self.hours = hours
+        self.counts = counts
+        self.bucket_offset = bucket_offset
+        self._stations, self._station_starts = np.unique(station_ids, return_index=True)
+        self._station_ends = np.append(self._station_starts[1:], len(station_ids))
+        self._total = np.asarray(counts.sum(axis=0), dtype=np.float64).ravel()
+
+    def _rows(self, stations=None, hours=None, year_months=None):
+        if stations is None:
+            rows = np.arange(len(self.station_ids))
+        else:
+            found = np.flatnonzero(np.isin(self._stations, stations))
+            rows = np.concatenate(
+                [np.arange(self._station_starts[i], self._station_ends[i]) for i in found] or [[]]
+            ).astype(np.int64)
+        if hours is not None:
+            rows = rows[np.isin(self.hours[rows], hours)]
+        if year_months is not None:
+            rows = rows[np.isin(self.year_months[rows], year_months)]
+        return rows
+
+    def merge(self, stations=None, hours=None, year_months=None):
+        """Dense bucket counts of every selected sketch added together (None = all)."""
+        if stations is None and hours is None and year_months is None:
+            return self._total
+        rows = self._rows(stations, hours, year_months)
+        starts, ends = self.counts.indptr[rows], self.counts.indptr[rows + 1]
+        lengths = ends - starts
+        # Positions of the selected rows' non-zeros in the CSR data array
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.bincount(
+            self.counts.indices[positions], weights=self.counts.data[positions], minlength=self.counts.shape[1]
+        )
+
+    def percentiles(self, stations=None, hours=None, year_months=None, qs=PERCENTILES):
+        """{quantile: duration in seconds} of the merged selection."""
+        values = quantiles(self.merge(stations, hours, year_months), self.bucket_offset, qs)
+        return dict(zip(qs, values))
+
+
+def build_duration_sketches(rows):
+    """
+    DurationSketches from duration_sketches rows (station_id, year, month,
+    trip_hour, bucket, trip_count).
+    """
+    year_month = rows["year"].to_numpy().astype(np.int64) * 100 + rows["month"].to_numpy().astype(np.int64)
+    keys = pd.DataFrame({
+        "station_id": rows["station_id"].to_numpy(),
+        "year_month": year_month,
+        "trip_hour": rows["trip_hour"].to_numpy().astype(np.int64),
+    })
+    key_frame = keys.drop_duplicates().sort_values(["station_id", "year_month", "trip_hour"], ignore_index=True)
+    key_rows = pd.MultiIndex.from_frame(key_frame).get_indexer(pd.MultiIndex.from_frame(keys))
+
+    bucket = rows["bucket"].to_numpy().astype(np.int64)
+    bucket_offset = int(bucket.min()) if len(bucket) else 0
+    counts = sparse.csr_matrix(
+        (rows["trip_count"].to_numpy().astype(np.int64), (key_rows, bucket - bucket_offset)),
+        shape=(len(key_frame), int(bucket.max()) - bucket_offset + 1 if len(bucket) else 0),
+    )
+    counts.sum_duplicates()
+    return DurationSketches(
+        key_frame["station_id"].to_numpy(), key_frame["year_month"].to_numpy(),
+        key_frame["trip_hour"].to_numpy(), counts, bucket_offset
+    )
@@ -0,0 +1,53 @@
+import pandas as pd
+
+# Columns that hold a station name in the analytics tables
+STATION_NAME_COLUMNS = ["station_name", "start_station_name", "end_station_name"]
+
+
+def normalise_station_names(df):
+    """
+    Strip stray whitespace from every station name column of a loaded table.
+    Run once at load time so the tabs never have to call .str.strip() again.
+    """
+    for col in STATION_NAME_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].str.strip()
+    return df
+
+
+def build_station_dim(station_static):
+    """
+    Build the normalised station dimension shared by all dashboard tabs.
+
+    One row per station name, sorted by name, with:
+      - station_code: integer code of the name (the row position)
+      - station_label: preformatted "<name> (<docks> docks)" chart label
+    """
+    station_dim = station_static[
+        ['station_id', 'station_name', 'latitude', 'longitude', 'docks_count']
+    ].copy()
+    station_dim['station_name'] = station_dim['station_name'].str.strip()
+    station_dim = (
+        station_dim.drop_duplicates('station_name')
+        .sort_values('station_name')
+        .reset_index(drop=True)
+    )
+
+    station_dim['station_code'] = station_dim.index.astype('int32')
+    station_dim['station_label'] = (
+        station_dim['station_name'] + " (" + station_dim['docks_count'].astype(str) + " docks)"
+    )
+    return station_dim
+
+
+def station_codes(station_dim, names):
+    """Map station names to their station_code (-1 for unknown names)."""
+    return pd.Categorical(names, categories=station_dim['station_name']).codes
+
+
+def station_labels(station_dim, names):
+    """Look up the preformatted chart label for each station name."""
+    codes = station_codes(station_dim, names)
+    labels = pd.Series(station_dim['station_label'].to_numpy()[codes], index=names.index)
+    # Unknown stations fall back to their bare name
+    return labels.where(codes >= 0, names)
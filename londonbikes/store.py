@@ -0,0 +1,180 @@
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+
+import pyarrow as pa
+
+from londonbikes.flow_cube import FlowCube, build_flow_cube
+from londonbikes.od_matrix import ODMatrices, build_od_matrices
+
+# -----------------------------
+# Snapshot location
+# -----------------------------
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SNAPSHOT_DIR = os.environ.get(
+    "LONDONBIKES_SNAPSHOT_DIR", os.path.join(REPO_ROOT, "data", "analytics_snapshots")
+)
+CURRENT_FILE = "CURRENT"
+KEEP_SNAPSHOTS = 2
+
+# Analytics tables the dashboard reads, with optional column projections
+DASHBOARD_TABLES = {
+    "monthly_kpis": None,
+    "quarter_hour_profile": None,
+    "top_stations": None,
+    "trip_duration_histogram": None,
+    "route_popularity": [
+        "year", "month", "day", "trip_hour",
+        "start_station_name", "end_station_name", "trip_count",
+    ],
+    "duration_band": None,
+    "return_to_origin": None,
+    "station_demand_supply_gap": None,
+    "station_static": None,
+    "route_heatmap_topk": None,
+    "tourist_catchments": None,
+    "rebalancing_monthly": None,
+    "station_demand_forecast": ["station_name", "forecast_date", "trip_hour", "forecast_starts", "forecast_ends"],
+}
+
+
+# -----------------------------
+# Export (analytics build side)
+# -----------------------------
+def _write_arrow(table, path):
+    # Uncompressed Arrow IPC so readers can memory-map it without decoding
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _point_current(root, version):
+    # Atomic pointer swap: readers see either the old or the new version
+    tmp_path = os.path.join(root, f".{CURRENT_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+
+
+def _prune(root, keep):
+    versions = sorted(
+        d for d in os.listdir(root)
+        if not d.startswith(".") and os.path.isdir(os.path.join(root, d))
+    )
+    # Readers that still map an old file keep it alive until they let go
+    for version in versions[:-keep]:
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+
+
+def export_snapshot(reader, dataset, tables=DASHBOARD_TABLES, root=SNAPSHOT_DIR, keep=KEEP_SNAPSHOTS):
+    """
+    Download the analytics tables into a new versioned snapshot directory and
+    atomically make it the current one. reader is an arrow_reader (Storage
+    Read API or Parquet stand-in). Returns the new version string.
+    """
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    tmp_dir = os.path.join(root, f".{version}.tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    for table_name, columns in tables.items():
+        arrow_table = reader.read(dataset, table_name, columns)
+        _write_arrow(arrow_table, os.path.join(tmp_dir, f"{table_name}.arrow"))
+        # Dense station x day x hour flows (memory-mapped by the dashboard) and
+        # sparse per-month/hour OD matrices, so the app never loads route rows
+        if table_name == "route_popularity":
+            route_df = arrow_table.to_pandas()
+            build_flow_cube(route_df).save(tmp_dir)
+            build_od_matrices(route_df).save(tmp_dir)
+
+    os.replace(tmp_dir, os.path.join(root, version))
+    _point_current(root, version)
+    _prune(root, keep)
+    return version
+
+
+def read_current_version(root=SNAPSHOT_DIR):
+    """Version the CURRENT pointer names, or None if nothing was exported yet."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+# -----------------------------
+# Read side (dashboard)
+# -----------------------------
+class Snapshot:
+    """
+    One immutable version of the analytics tables.
+
+    Arrow tables are memory-mapped, so every session in the process reads
+    the same pages. DataFrames are converted once per table and shared too:
+    callers must treat them as read-only.
+    """
+
+    def __init__(self, version, tables, prepare=None, cube=None, od=None):
+        self.version = version
+        self.cube = cube
+        self.od = od
+        self._tables = tables
+        self._prepare = prepare
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def has(self, table_name):
+        return table_name in self._tables
+
+    def table(self, table_name):
+        return self._tables[table_name]
+
+    def frame(self, table_name):
+        frame = self._frames.get(table_name)
+        if frame is None:
+            with self._lock:
+                frame = self._frames.get(table_name)
+                if frame is None:
+                    frame = self._tables[table_name].to_pandas(split_blocks=True)
+                    if self._prepare is not None:
+                        frame = self._prepare(frame, table_name)
+                    self._frames[table_name] = frame
+        return frame
+
+
+def load_snapshot(root, version, prepare=None):
+    tables = {}
+    cube = od = None
+    if version is not None:
+        version_dir = os.path.join(root, version)
+        for file_name in os.listdir(version_dir):
+            if file_name.endswith(".arrow"):
+                source = pa.memory_map(os.path.join(version_dir, file_name), "r")
+                tables[file_name[:-len(".arrow")]] = pa.ipc.open_file(source).read_all()
+        cube = FlowCube.load(version_dir)
+        od = ODMatrices.load(version_dir)
+    return Snapshot(version, tables, prepare, cube, od)
+
+
+class DatasetStore:
+    """
+    Process-wide holder of the current Snapshot.
+
+    snapshot() checks the CURRENT pointer and swaps in a newly exported
+    version atomically; sessions holding the previous Snapshot keep using it
+    until their next rerun.
+    """
+
+    def __init__(self, root=SNAPSHOT_DIR, prepare=None):
+        self.root = root
+        self.prepare = prepare
+        self._lock = threading.Lock()
+        self._snapshot = Snapshot(None, {}, prepare)
+
+    def snapshot(self):
+        version = read_current_version(self.root)
+        if version != self._snapshot.version:
+            with self._lock:
+                if version != self._snapshot.version:
+                    self._snapshot = load_snapshot(self.root, version, self.prepare)
+        return self._snapshot
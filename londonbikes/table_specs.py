@@ -0,0 +1,85 @@
+import logging
+
+from google.cloud import bigquery
+from google.api_core.exceptions import NotFound
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Physical layout of the analytics tables
+# -----------------------------
+# partition: (DATE column, "DAY" | "MONTH" | "YEAR") time partitioning.
+# cluster:   up to four columns, in filter order (year/month before hour before station).
+# Small tables (a few hundred rows) get no spec: BigQuery would read one
+# block either way. Tables not listed are written unpartitioned.
+TABLE_SPECS = {
+    "daily_summaries": {"cluster": ["date"]},
+    "hourly_counts": {"partition": ("date", "MONTH"), "cluster": ["trip_hour"]},
+    "top_stations": {"cluster": ["year", "month", "station_name"]},
+    "route_popularity": {
+        "partition": ("trip_date", "MONTH"),
+        "cluster": ["trip_hour", "start_station_name", "end_station_name"],
+    },
+    "trip_duration_histogram": {"cluster": ["year", "month", "trip_hour"]},
+    "station_demand_supply_gap": {"cluster": ["year", "month", "station_name"]},
+    "route_heatmap_topk": {"cluster": ["year_month", "trip_hour"]},
+    "rebalancing_moves": {"partition": ("move_date", "MONTH"), "cluster": ["move_hour", "station_id"]},
+    "rebalancing_monthly": {"cluster": ["year", "month", "move_hour"]},
+    "station_occupancy_daily": {"partition": ("date", "MONTH"), "cluster": ["station_id"]},
+    "duration_sketches": {"partition": ("sketch_month", "MONTH"), "cluster": ["station_id", "trip_hour"]},
+    "station_bike_sketches": {"partition": ("date", "MONTH"), "cluster": ["station_id"]},
+}
+
+
+def _spec_layout(spec):
+    partition = spec.get("partition")
+    return (tuple(partition) if partition else None, list(spec.get("cluster") or []) or None)
+
+
+def _table_layout(table):
+    partition = None
+    if table.time_partitioning is not None:
+        partition = (table.time_partitioning.field, table.time_partitioning.type_)
+    return (partition, list(table.clustering_fields or []) or None)
+
+
+def _drop_if_layout_changed(client, table_id, spec):
+    # A WRITE_TRUNCATE query cannot change an existing table's partitioning
+    # or clustering, so a table built under an older spec is dropped first
+    try:
+        table = client.get_table(table_id)
+    except NotFound:
+        return
+    if _table_layout(table) != _spec_layout(spec):
+        logger.info("Layout of %s changed, dropping it before rebuild", table_id)
+        client.delete_table(table_id)
+
+
+def _apply_layout(job_config, spec):
+    if spec.get("partition"):
+        field, unit = spec["partition"]
+        job_config.time_partitioning = bigquery.TimePartitioning(type_=unit, field=field)
+    if spec.get("cluster"):
+        job_config.clustering_fields = spec["cluster"]
+    return job_config
+
+
+def _table_spec(client, table_id):
+    spec = TABLE_SPECS.get(table_id.rsplit(".", 1)[-1], {})
+    _drop_if_layout_changed(client, table_id, spec)
+    return spec
+
+
+def table_config(client, table_id, write_disposition="WRITE_TRUNCATE"):
+    """
+    QueryJobConfig writing to table_id with the layout TABLE_SPECS declares
+    for it (matched on the table name).
+    """
+    spec = _table_spec(client, table_id)
+    return _apply_layout(bigquery.QueryJobConfig(destination=table_id, write_disposition=write_disposition), spec)
+
+
+def load_config(client, table_id, write_disposition="WRITE_TRUNCATE"):
+    """LoadJobConfig counterpart of table_config, for tables built in Python."""
+    spec = _table_spec(client, table_id)
+    return _apply_layout(bigquery.LoadJobConfig(write_disposition=write_disposition), spec)
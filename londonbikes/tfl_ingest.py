@@ -0,0 +1,281 @@
+import argparse
+import csv
+import os
+import re
+import shutil
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+from londonbikes.parallel import map_chunks, split, default_workers
+
+# -----------------------------
+# TfL usage-stats CSV ingestion
+# -----------------------------
+# Directories of TfL journey extracts (https://cycling.data.tfl.gov.uk/)
+# normalised into the cycle_hire_raw layout and written as Parquet
+# partitioned by start month: <out>/start_month=YYYY-MM/part-0.parquet.
+#   1. files are parsed in parallel processes; each writes its rows as one
+#      fragment per start month into <out>/_staging
+#   2. months are merged in parallel: staged fragments plus any existing
+#      output partition, deduplicated on rental_id, sorted by start_date
+# A rental found more than once keeps the row with the most resolved station
+# ids (start_station_id / end_station_id), then the one from the most recent
+# source: files rank by the latest start_date they contain, and the existing
+# output ranks below every file of the run. Ties keep the first row of the
+# source, so the winner depends on the data, not on file names.
+# A rental's start month never changes, so per-month dedup is global, and
+# re-running over new files only rewrites the months they touch.
+#
+# The extracts changed header names over the years (and in Sept 2022 moved
+# from station ids to terminal numbers). Headers are matched after
+# lower-casing and dropping non-alphanumerics. Newer files carry no station
+# id: the terminal goes to *_logical_terminal and stg_cycle_hire resolves
+# the id by station name. Timestamps are stored as epoch microseconds of
+# the London wall-clock time, like the public dataset's Avro export.
+STAGING_DIR = "_staging"
+PARTITION_KEY = "start_month"
+
+RAW_SCHEMA = pa.schema([
+    ("rental_id", pa.int64()),
+    ("duration", pa.int64()),
+    ("duration_ms", pa.int64()),
+    ("bike_id", pa.int64()),
+    ("bike_model", pa.string()),
+    ("end_date", pa.int64()),
+    ("end_station_id", pa.int64()),
+    ("end_station_name", pa.string()),
+    ("end_station_logical_terminal", pa.int64()),
+    ("start_date", pa.int64()),
+    ("start_station_id", pa.int64()),
+    ("start_station_name", pa.string()),
+    ("start_station_logical_terminal", pa.int64()),
+])
+
+# Normalised CSV header -> cycle_hire_raw column
+HEADER_ALIASES = {
+    "rentalid": "rental_id",
+    "number": "rental_id",
+    "duration": "duration",
+    "durationseconds": "duration",
+    "totaldurationms": "duration_ms",
+    "bikeid": "bike_id",
+    "bikenumber": "bike_id",
+    "bikemodel": "bike_model",
+    "startdate": "start_date",
+    "enddate": "end_date",
+    "startstationid": "start_station_id",
+    "endstationid": "end_station_id",
+    "startstationnumber": "start_station_logical_terminal",
+    "endstationnumber": "end_station_logical_terminal",
+    "startstationlogicalterminal": "start_station_logical_terminal",
+    "endstationlogicalterminal": "end_station_logical_terminal",
+    "startstationname": "start_station_name",
+    "startstation": "start_station_name",
+    "endstationname": "end_station_name",
+    "endstation": "end_station_name",
+}
+
+DATE_FORMATS = ["%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S"]
+
+
+def _normalise_header(name):
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def _to_int(values):
+    # Clean columns cast directly; otherwise trimmed integer strings ("123",
+    # "123.0") -> int64 and anything else -> null
+    try:
+        return pc.cast(values, pa.int64())
+    except pa.ArrowInvalid:
+        pass
+    values = pc.utf8_trim_whitespace(values)
+    valid = pc.match_substring_regex(values, r"^-?\d+(\.0*)?$")
+    return pc.cast(pc.cast(pc.if_else(valid, values, pa.scalar(None, pa.string())), pa.float64()), pa.int64())
+
+
+def _to_micros(values):
+    # Formats are tried in order, each only while some values are still unparsed
+    values = pc.utf8_trim_whitespace(values)
+    parsed = None
+    for fmt in DATE_FORMATS:
+        attempt = pc.strptime(values, format=fmt, unit="us", error_is_null=True)
+        parsed = attempt if parsed is None else pc.coalesce(parsed, attempt)
+        if parsed.null_count == values.null_count:
+            break
+    return pc.cast(parsed, pa.int64())
+
+
+def read_tfl_csv(path, use_threads=True):
+    """One TfL extract as an Arrow table in the cycle_hire_raw layout."""
+    with open(path, encoding="utf-8-sig", errors="replace", newline="") as f:
+        names = [name.strip() for name in next(csv.reader([f.readline()]), [])]
+    columns = {name: HEADER_ALIASES.get(_normalise_header(name)) for name in names}
+
+    table = pv.read_csv(
+        path,
+        read_options=pv.ReadOptions(use_threads=use_threads, column_names=names, skip_rows=1),
+        convert_options=pv.ConvertOptions(
+            include_columns=[name for name, column in columns.items() if column],
+            column_types={name: pa.string() for name in names},
+            strings_can_be_null=True,
+        ),
+    )
+
+    raw = {}
+    for name in table.column_names:
+        column = columns[name]
+        if column in raw:
+            continue
+        values = table[name]
+        if column in ("start_date", "end_date"):
+            raw[column] = _to_micros(values)
+        elif RAW_SCHEMA.field(column).type == pa.string():
+            raw[column] = pc.utf8_trim_whitespace(values)
+        else:
+            raw[column] = _to_int(values)
+
+    if "duration" not in raw and "duration_ms" in raw:
+        raw["duration"] = pc.divide(raw["duration_ms"], 1000)
+    if "duration_ms" not in raw and "duration" in raw:
+        raw["duration_ms"] = pc.multiply(raw["duration"], 1000)
+
+    return pa.Table.from_arrays(
+        [raw.get(field.name, pa.chunked_array([pa.nulls(table.num_rows, field.type)])) for field in RAW_SCHEMA],
+        schema=RAW_SCHEMA,
+    )
+
+
+def _start_months(start_micros):
+    return start_micros.to_numpy().astype("datetime64[us]").astype("datetime64[M]").astype(str)
+
+
+def _stage_files(chunk):
+    # Phase 1: parse files, write one fragment per start month
+    files, staging_root, use_threads = chunk
+    rows_read = rows_kept = 0
+    months = set()
+    latest = {}
+    for file_index, path in files:
+        table = read_tfl_csv(path, use_threads=use_threads)
+        rows_read += table.num_rows
+        # A row needs a rental_id to deduplicate on and a start_date to partition by
+        table = table.filter(pc.and_(pc.is_valid(table["rental_id"]), pc.is_valid(table["start_date"])))
+        rows_kept += table.num_rows
+        if not table.num_rows:
+            continue
+        latest[file_index] = pc.max(table["start_date"]).as_py()
+        month_of_row = _start_months(table["start_date"])
+        for month in np.unique(month_of_row):
+            month_dir = os.path.join(staging_root, f"{PARTITION_KEY}={month}")
+            os.makedirs(month_dir, exist_ok=True)
+            pq.write_table(
+                table.filter(pa.array(month_of_row == month)),
+                # Named by file index, which the merge maps to the file's recency rank
+                os.path.join(month_dir, f"{file_index:06d}.parquet")
+            )
+            months.add(month)
+    return rows_read, rows_kept, months, latest
+
+
+def _winning_rows(table, source_rank):
+    # Per rental_id: most resolved station ids, then highest source rank, then first row
+    rental_id = table["rental_id"].to_numpy()
+    resolved = sum(
+        pc.is_valid(table[column]).to_numpy(zero_copy_only=False).astype(np.int8)
+        for column in ("start_station_id", "end_station_id")
+    )
+    order = np.lexsort((np.arange(len(rental_id)), -source_rank, -resolved, rental_id))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = rental_id[order[1:]] != rental_id[order[:-1]]
+    return np.sort(order[first])
+
+
+def _merge_month(chunk):
+    # Phase 2: existing partition + staged fragments -> deduplicated partition
+    months, staging_root, out_dir, source_ranks = chunk
+    written = duplicates = 0
+    for month in months:
+        partition = f"{PARTITION_KEY}={month}"
+        out_path = os.path.join(out_dir, partition, "part-0.parquet")
+        tables, ranks = [], []
+        if os.path.exists(out_path):
+            tables.append(pq.read_table(out_path))
+            ranks.append(np.full(tables[-1].num_rows, -1))
+        for name in sorted(os.listdir(os.path.join(staging_root, partition))):
+            tables.append(pq.read_table(os.path.join(staging_root, partition, name)))
+            ranks.append(np.full(tables[-1].num_rows, source_ranks[int(os.path.splitext(name)[0])]))
+        table = pa.concat_tables(tables)
+
+        deduped = table.take(pa.array(_winning_rows(table, np.concatenate(ranks))))
+        deduped = deduped.sort_by("start_date")
+        duplicates += table.num_rows - deduped.num_rows
+        written += deduped.num_rows
+
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        tmp_path = out_path + ".tmp"
+        pq.write_table(deduped, tmp_path)
+        os.replace(tmp_path, out_path)
+    return written, duplicates
+
+
+def ingest_tfl_csvs(csv_dir, out_dir, workers=None):
+    """
+    Ingest every *.csv under csv_dir into month-partitioned Parquet in
+    out_dir. Returns a summary dict: files, rows read/kept (with a
+    rental_id and start_date), rows in the rewritten partitions, duplicates
+    dropped, months touched, seconds and rows_per_minute.
+    """
+    start = time.perf_counter()
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(csv_dir) for name in names if name.lower().endswith(".csv")
+    )
+    workers = workers or default_workers()
+    staging_root = os.path.join(out_dir, STAGING_DIR)
+    shutil.rmtree(staging_root, ignore_errors=True)
+    os.makedirs(staging_root)
+
+    # Parallel processes already use every core: keep Arrow single-threaded inside them
+    use_threads = workers == 1
+    files = list(enumerate(paths))
+    staged = map_chunks(_stage_files, [(part, staging_root, use_threads) for part in split(files, workers * 4)], workers)
+    rows_read = sum(result[0] for result in staged)
+    rows_kept = sum(result[1] for result in staged)
+    months = sorted(set().union(*(result[2] for result in staged)))
+    # Recency rank of each staged file: its latest start_date, then its path
+    latest = {index: start for result in staged for index, start in result[3].items()}
+    source_ranks = {index: rank for rank, index in enumerate(sorted(latest, key=lambda i: (latest[i], i)))}
+
+    merged = map_chunks(
+        _merge_month, [(part, staging_root, out_dir, source_ranks) for part in split(months, workers * 4)], workers
+    )
+    shutil.rmtree(staging_root, ignore_errors=True)
+
+    seconds = time.perf_counter() - start
+    return {
+        "files": len(paths),
+        "rows_read": rows_read,
+        "rows_kept": rows_kept,
+        "rows_written": sum(result[0] for result in merged),
+        "duplicates": sum(result[1] for result in merged),
+        "months": len(months),
+        "seconds": seconds,
+        "rows_per_minute": rows_read / seconds * 60 if seconds else 0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest TfL usage-stats CSVs into partitioned cycle_hire_raw Parquet")
+    parser.add_argument("csv_dir")
+    parser.add_argument("out_dir")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    summary = ingest_tfl_csvs(args.csv_dir, args.out_dir, args.workers)
+    print(f"Ingested {summary['files']} files: {summary['rows_written']:,} rows in {summary['months']} months "
+          f"({summary['duplicates']:,} duplicates dropped, {summary['rows_per_minute']:,.0f} rows/min)")
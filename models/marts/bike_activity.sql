@@ -0,0 +1,81 @@
+-- Per bike per day activity, built in one window pass over fact_trips
+-- (partitioned by bike, ordered by trip start) with no self-joins.
+--
+-- Incremental runs only read trips from the last built day onwards (that
+-- day is rebuilt in case it was partial). Each bike's latest earlier row is
+-- carried in as a pseudo-trip so the first new trip still gets its idle gap.
+{{
+  config(
+    materialized='incremental',
+    incremental_strategy='merge',
+    unique_key=['bike_id', 'activity_date'],
+    partition_by={'field': 'activity_date', 'data_type': 'date', 'granularity': 'month'},
+    cluster_by=['bike_id']
+  )
+}}
+
+with trips as (
+
+  select
+    bike_id,
+    rental_id,
+    trip_start,
+    trip_start_ts,
+    trip_end_ts,
+    duration,
+    start_station_id,
+    end_station_id,
+    false as is_carry
+  from {{ ref('fact_trips') }}
+  where bike_id is not null
+  {% if is_incremental() %}
+    and trip_start >= (select max(activity_date) from {{ this }})
+  {% endif %}
+
+  {% if is_incremental() %}
+  union all
+
+  -- Last known position of every bike before the rebuilt window
+  select
+    bike_id,
+    null as rental_id,
+    activity_date as trip_start,
+    last_trip_end_ts as trip_start_ts,
+    last_trip_end_ts as trip_end_ts,
+    0 as duration,
+    last_end_station_id as start_station_id,
+    last_end_station_id as end_station_id,
+    true as is_carry
+  from {{ this }}
+  where activity_date < (select max(activity_date) from {{ this }})
+  qualify row_number() over (partition by bike_id order by activity_date desc) = 1
+  {% endif %}
+
+),
+
+chained as (
+
+  select
+    *,
+    lag(trip_end_ts) over bike_trips as prev_trip_end_ts
+  from trips
+  window bike_trips as (partition by bike_id order by trip_start_ts, rental_id)
+
+)
+
+select
+  bike_id,
+  trip_start as activity_date,
+  count(*) as trips,
+  round(sum(duration) / 3600, 3) as ride_hours,
+  min(trip_start_ts) as first_trip_start_ts,
+  max(trip_end_ts) as last_trip_end_ts,
+  -- Time parked since the previous trip ended, for trips starting this day
+  count(prev_trip_end_ts) as idle_gaps,
+  round(sum(greatest(timestamp_diff(trip_start_ts, prev_trip_end_ts, second), 0)) / 3600, 3) as idle_hours,
+  round(max(greatest(timestamp_diff(trip_start_ts, prev_trip_end_ts, second), 0)) / 3600, 3) as max_idle_hours,
+  array_agg(start_station_id ignore nulls order by trip_start_ts limit 1)[safe_offset(0)] as first_start_station_id,
+  array_agg(end_station_id ignore nulls order by trip_start_ts desc limit 1)[safe_offset(0)] as last_end_station_id
+from chained
+where not is_carry
+group by bike_id, activity_date
@@ -0,0 +1,38 @@
+-- One row per bike, rolled up from the daily bike_activity model.
+-- Home station: the station the bike most often ends its day at.
+with bikes as (
+
+  select
+    bike_id,
+    min(first_trip_start_ts) as first_seen_ts,
+    max(last_trip_end_ts) as last_seen_ts,
+    count(*) as active_days,
+    sum(trips) as total_trips,
+    round(sum(ride_hours), 2) as ride_hours,
+    sum(idle_gaps) as idle_gaps,
+    round(sum(idle_hours), 2) as idle_hours,
+    round(safe_divide(sum(idle_hours), sum(idle_gaps)), 2) as avg_idle_hours,
+    max(max_idle_hours) as max_idle_hours,
+    approx_top_count(last_end_station_id, 1)[safe_offset(0)].value as home_station_id
+  from {{ ref('bike_activity') }}
+  group by bike_id
+
+)
+
+select
+  b.bike_id,
+  b.first_seen_ts,
+  b.last_seen_ts,
+  date_diff(date(b.last_seen_ts), date(b.first_seen_ts), day) + 1 as lifespan_days,
+  b.active_days,
+  b.total_trips,
+  b.ride_hours,
+  b.idle_gaps,
+  b.idle_hours,
+  b.avg_idle_hours,
+  b.max_idle_hours,
+  b.home_station_id,
+  s.station_name as home_station_name
+from bikes b
+left join {{ ref('dim_stations') }} s
+  on b.home_station_id = s.station_id
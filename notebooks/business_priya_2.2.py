@@ -1,16 +1,34 @@
 # Import libraries
-from google.cloud import bigquery
-from google.cloud import bigquery_storage
 from dotenv import load_dotenv
 import os
+import sys
+from datetime import timedelta
+
+# Make the shared londonbikes package (repo root) importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from londonbikes.store import export_snapshot
+from londonbikes.arrow_reader import arrow_reader
+from londonbikes.clients import get_bigquery_client, get_bqstorage_client
+from londonbikes.budget import QueryBudget, GB
+from londonbikes.table_specs import table_config, load_config
+from londonbikes.occupancy import simulate_occupancy
+from londonbikes.forecast import forecast_demand
+from londonbikes.network import network_metrics
+from londonbikes.sketch import bucket_sql, build_duration_sketches
+from londonbikes.distinct import HLL_PRECISION, distinct_bikes, relative_error
+from google.api_core.exceptions import NotFound
+from londonbikes.geo import assign_catchments, catchment_trips
 
 # -----------------------------
 # Setup
 # -----------------------------
 load_dotenv()  # Load environment variables
 project_id = os.environ.get("DSAI_PROJECT_ID")
-client = bigquery.Client(project=project_id)
-bqstorage_client = bigquery_storage.BigQueryReadClient()
+client = get_bigquery_client(project_id)
+bqstorage_client = get_bqstorage_client()
+reader = arrow_reader(get_bqstorage_client, project_id)
+# Every statement is dry-run and checked against the byte budgets before it runs
+budget = QueryBudget(client)
 analytics_dataset = "LondonBicycles_Analytics"
 
 # Duration filter for outliers
@@ -37,10 +55,9 @@ LEFT JOIN `{project_id}.LondonBicycles_Core.dim_dates` d
   ON t.trip_start = d.date
 WHERE t.duration BETWEEN {DURATION_SEC_MIN} AND {DURATION_SEC_MAX}
 GROUP BY d.date, d.year, d.month, d.weekday
-ORDER BY d.date
 """
 daily_table = f"{project_id}.{analytics_dataset}.daily_summaries"
-client.query(query_daily, job_config=bigquery.QueryJobConfig(destination=daily_table, write_disposition="WRITE_TRUNCATE")).result()
+budget.query(query_daily, job_config=table_config(client, daily_table)).result()
 print(f"✅ Daily summaries saved: {daily_table}")
 
 # -----------------------------
@@ -58,10 +75,9 @@ JOIN `{project_id}.LondonBicycles_Core.dim_dates` d
   ON t.trip_start = d.date
 WHERE t.duration BETWEEN {DURATION_SEC_MIN} AND {DURATION_SEC_MAX}
 GROUP BY d.year, week
-ORDER BY d.year, week
 """
 weekly_table = f"{project_id}.{analytics_dataset}.weekly_summaries"
-client.query(query_weekly, job_config=bigquery.QueryJobConfig(destination=weekly_table, write_disposition="WRITE_TRUNCATE")).result()
+budget.query(query_weekly, job_config=table_config(client, weekly_table)).result()
 print(f"✅ Weekly summaries saved: {weekly_table}")
 
 # -----------------------------
@@ -79,10 +95,9 @@ JOIN `{project_id}.LondonBicycles_Core.dim_dates` d
   ON t.trip_start = d.date
 WHERE t.duration BETWEEN {DURATION_SEC_MIN} AND {DURATION_SEC_MAX}
 GROUP BY d.year, d.month
-ORDER BY d.year, d.month
 """
 monthly_table = f"{project_id}.{analytics_dataset}.monthly_summaries"
-client.query(query_monthly, job_config=bigquery.QueryJobConfig(destination=monthly_table, write_disposition="WRITE_TRUNCATE")).result()
+budget.query(query_monthly, job_config=table_config(client, monthly_table)).result()
 print(f"✅ Monthly summaries saved: {monthly_table}")
 
 # -----------------------------
@@ -102,10 +117,9 @@ JOIN `{project_id}.LondonBicycles_Core.dim_dates` d
   ON t.trip_start = d.date
 WHERE t.duration BETWEEN {DURATION_SEC_MIN} AND {DURATION_SEC_MAX}
 GROUP BY d.date, d.year, d.month, d.weekday, trip_hour
-ORDER BY d.date, trip_hour
 """
 hourly_table = f"{project_id}.{analytics_dataset}.hourly_counts"
-client.query(query_hourly, job_config=bigquery.QueryJobConfig(destination=hourly_table, write_disposition="WRITE_TRUNCATE")).result()
+budget.query(query_hourly, job_config=table_config(client, hourly_table)).result()
 print(f"✅ Hourly counts saved: {hourly_table}")
 
 # -----------------------------
@@ -132,10 +146,9 @@ JOIN `{project_id}.LondonBicycles_Core.dim_dates` d
   ON t.trip_start = d.date
 WHERE t.duration BETWEEN {DURATION_SEC_MIN} AND {DURATION_SEC_MAX}
 GROUP BY s.station_id, s.station_name, station_area, s.latitude, s.longitude, s.docks_count, d.year, d.month
-ORDER BY d.year, d.month, GREATEST(trips_started, trips_ended) DESC
 """
 stations_table = f"{project_id}.{analytics_dataset}.top_stations"
-client.query(query_stations, job_config=bigquery.QueryJobConfig(destination=stations_table, write_disposition="WRITE_TRUNCATE")).result()
+budget.query(query_stations, job_config=table_config(client, stations_table)).result()
 print(f"✅ Top stations saved: {stations_table}")
 
 # -----------------------------
@@ -143,6 +156,7 @@ print(f"✅ Top stations saved: {stations_table}")
 # -----------------------------
 query_route_popularity = f"""
 SELECT
+  d.date AS trip_date,
   d.year,
   d.month,
   d.day,
@@ -160,13 +174,12 @@ JOIN `{project_id}.LondonBicycles_Core.dim_dates` d
   ON t.trip_start = d.date
 WHERE t.duration BETWEEN {DURATION_SEC_MIN} AND {DURATION_SEC_MAX}
 AND t.trip_start >= DATE_SUB((SELECT MAX(trip_start) FROM `{project_id}.LondonBicycles_Core.fact_trips`), INTERVAL 12 MONTH)
-GROUP BY d.year, d.month, d.day, trip_hour,
+GROUP BY d.date, d.year, d.month, d.day, trip_hour,
          t.start_station_id, t.start_station_name, start_station_area,
          t.end_station_id, t.end_station_name, end_station_area
-ORDER BY d.year, d.month, trip_hour, trip_count DESC
 """
 popularity_table = f"{project_id}.{analytics_dataset}.route_popularity"
-client.query(query_route_popularity, job_config=bigquery.QueryJobConfig(destination=popularity_table, write_disposition="WRITE_TRUNCATE")).result()
+budget.query(query_route_popularity, job_config=table_config(client, popularity_table)).result()
 print(f"✅ Route popularity saved: {popularity_table}")
 
 # -----------------------------
@@ -184,10 +197,9 @@ JOIN `{project_id}.LondonBicycles_Core.dim_dates` d
   ON t.trip_start = d.date
 WHERE t.duration BETWEEN {DURATION_SEC_MIN} AND {DURATION_SEC_MAX}
 GROUP BY d.year, d.month, trip_hour, duration_minutes_bin
-ORDER BY d.year, d.month, trip_hour, duration_minutes_bin
 """
 duration_table = f"{project_id}.{analytics_dataset}.trip_duration_histogram"
-client.query(query_duration_hist, job_config=bigquery.QueryJobConfig(destination=duration_table, write_disposition="WRITE_TRUNCATE")).result()
+budget.query(query_duration_hist, job_config=table_config(client, duration_table)).result()
 print(f"✅ Trip duration histogram saved: {duration_table}")
 
 # -----------------------------
@@ -213,10 +225,9 @@ JOIN `{project_id}.LondonBicycles_Core.dim_dates` d
   ON t.trip_start = d.date
 WHERE t.duration BETWEEN {DURATION_SEC_MIN} AND {DURATION_SEC_MAX}
 GROUP BY d.year,d.month,duration_band
-ORDER BY d.year,d.month,trip_count DESC
 """
 duration_band_table = f"{project_id}.{analytics_dataset}.duration_band"
-client.query(query_duration_band, job_config=bigquery.QueryJobConfig(destination=duration_band_table, write_disposition="WRITE_TRUNCATE")).result()
+budget.query(query_duration_band, job_config=table_config(client, duration_band_table)).result()
 print(f"✅ Duration band stats saved: {duration_band_table}")
 
 # -----------------------------
@@ -234,10 +245,9 @@ JOIN `{project_id}.LondonBicycles_Core.dim_dates` d
   ON t.trip_start = d.date
 WHERE t.duration BETWEEN {DURATION_SEC_MIN} AND {DURATION_SEC_MAX}
 GROUP BY d.year, d.month
-ORDER BY d.year, d.month
 """
 return_origin_table = f"{project_id}.{analytics_dataset}.return_to_origin"
-client.query(query_return_origin, job_config=bigquery.QueryJobConfig(destination=return_origin_table, write_disposition="WRITE_TRUNCATE")).result()
+budget.query(query_return_origin, job_config=table_config(client, return_origin_table)).result()
 print(f"✅ Return to origin stats saved: {return_origin_table}")
 
 # -----------------------------
@@ -260,10 +270,9 @@ JOIN `{project_id}.LondonBicycles_Core.dim_dates` d
   ON t.trip_start = d.date
 WHERE t.duration BETWEEN {DURATION_SEC_MIN} AND {DURATION_SEC_MAX}
 GROUP BY d.year,d.month,s.station_id,s.station_name,s.docks_count
-ORDER BY ABS(net_inflow) DESC
 """
 supply_demand_table = f"{project_id}.{analytics_dataset}.station_demand_supply_gap"
-client.query(query_supply_demand, job_config=bigquery.QueryJobConfig(destination=supply_demand_table, write_disposition="WRITE_TRUNCATE")).result()
+budget.query(query_supply_demand, job_config=table_config(client, supply_demand_table)).result()
 print(f"✅ Station demand supply gap saved: {supply_demand_table}")
 
 # Analytical dataset and new table name
@@ -288,5 +297,448 @@ FROM `{project_id}.LondonBicycles_Core.dim_stations`;
 """
 
 # Run the query
-client.query(query_station_static).result()
+budget.query(query_station_static).result()
 print(f"✅ Station static table created in analytics layer: {station_static_table}")
+
+# -----------------------------
+# 11. Monthly KPIs (Overall Trends tab)
+# -----------------------------
+# A few hundred rows the dashboard rolls up to yearly KPIs. The sum of daily
+# average durations is kept with the day count so yearly means of the daily
+# averages can be recovered exactly.
+query_monthly_kpis = f"""
+SELECT
+  year,
+  month,
+  SUM(trip_count) AS trip_count,
+  COUNT(*) AS active_days,
+  SUM(avg_duration_minutes) AS daily_avg_duration_sum,
+  MIN(date) AS first_date,
+  MAX(date) AS last_date
+FROM `{daily_table}`
+GROUP BY year, month
+"""
+monthly_kpis_table = f"{project_id}.{analytics_dataset}.monthly_kpis"
+budget.query(query_monthly_kpis, job_config=table_config(client, monthly_kpis_table)).result()
+print(f"✅ Monthly KPIs saved: {monthly_kpis_table}")
+
+# -----------------------------
+# 12. Quarter x hour profile
+# -----------------------------
+query_quarter_hour = f"""
+SELECT
+  EXTRACT(QUARTER FROM date) AS quarter,
+  trip_hour,
+  AVG(trip_count) AS trip_count
+FROM `{hourly_table}`
+GROUP BY quarter, trip_hour
+"""
+quarter_hour_table = f"{project_id}.{analytics_dataset}.quarter_hour_profile"
+budget.query(query_quarter_hour, job_config=table_config(client, quarter_hour_table)).result()
+print(f"✅ Quarter-hour profile saved: {quarter_hour_table}")
+
+# -----------------------------
+# 13. Route heatmap top-K matrices
+# -----------------------------
+# For every hour, over all 12 months (year_month = 0) and for each month, keep
+# the start x end trip counts between the top-K start and top-K end stations,
+# so the dashboard heatmap is a lookup instead of a groupby over route_popularity.
+ROUTE_HEATMAP_TOP_K = 10
+
+query_route_heatmap = f"""
+WITH route_totals AS (
+  SELECT 0 AS year_month, trip_hour, start_station_name, end_station_name, SUM(trip_count) AS trip_count
+  FROM `{popularity_table}`
+  GROUP BY trip_hour, start_station_name, end_station_name
+  UNION ALL
+  SELECT year * 100 + month AS year_month, trip_hour, start_station_name, end_station_name, SUM(trip_count) AS trip_count
+  FROM `{popularity_table}`
+  GROUP BY year_month, trip_hour, start_station_name, end_station_name
+),
+start_ranks AS (
+  SELECT
+    year_month,
+    trip_hour,
+    start_station_name,
+    ROW_NUMBER() OVER (PARTITION BY year_month, trip_hour ORDER BY SUM(trip_count) DESC) AS start_rank
+  FROM route_totals
+  GROUP BY year_month, trip_hour, start_station_name
+  QUALIFY start_rank <= {ROUTE_HEATMAP_TOP_K}
+),
+end_ranks AS (
+  SELECT
+    year_month,
+    trip_hour,
+    end_station_name,
+    ROW_NUMBER() OVER (PARTITION BY year_month, trip_hour ORDER BY SUM(trip_count) DESC) AS end_rank
+  FROM route_totals
+  GROUP BY year_month, trip_hour, end_station_name
+  QUALIFY end_rank <= {ROUTE_HEATMAP_TOP_K}
+)
+SELECT
+  r.year_month,
+  r.trip_hour,
+  s.start_rank,
+  r.start_station_name,
+  e.end_rank,
+  r.end_station_name,
+  r.trip_count
+FROM route_totals r
+JOIN start_ranks s USING (year_month, trip_hour, start_station_name)
+JOIN end_ranks e USING (year_month, trip_hour, end_station_name)
+"""
+route_heatmap_table = f"{project_id}.{analytics_dataset}.route_heatmap_topk"
+budget.query(query_route_heatmap, job_config=table_config(client, route_heatmap_table)).result()
+print(f"✅ Route heatmap top-K saved: {route_heatmap_table}")
+
+# -----------------------------
+# 14. Tourist spot catchments
+# -----------------------------
+# Each station joins the catchment of its nearest tourist spot within each
+# radius in geo.CATCHMENT_RADII_M; trips are summed per catchment so the
+# dashboard never computes distances at runtime.
+stations_geo = reader.read(analytics_dataset, "station_static", ["station_id", "latitude", "longitude"]).to_pandas()
+
+station_trips = budget.query(f"""
+SELECT station_id, SUM(trips_started) AS trips_started, SUM(trips_ended) AS trips_ended
+FROM `{stations_table}`
+GROUP BY station_id
+""").to_dataframe(bqstorage_client=bqstorage_client)
+
+catchments = catchment_trips(assign_catchments(stations_geo), station_trips)
+catchments_table = f"{project_id}.{analytics_dataset}.tourist_catchments"
+client.load_table_from_dataframe(catchments, catchments_table, job_config=load_config(client, catchments_table)).result()
+print(f"✅ Tourist catchments saved: {catchments_table}")
+
+# -----------------------------
+# 15. Rebalancing moves (incremental)
+# -----------------------------
+# When a bike's next trip starts at a different station than its previous
+# trip ended, an operator moved it. LAG over each bike's trips (partitioned
+# by bike_id, so memory is bounded by one bike's history) pairs every trip
+# with the previous one; moves are counted per station and hour at the time
+# the bike reappears. Gaps of REBALANCE_MAX_GAP_DAYS or more are treated as
+# workshop visits, not van moves, which also bounds how far back an
+# incremental run has to look.
+REBALANCE_MAX_GAP_DAYS = 30
+rebalancing_table = f"{project_id}.{analytics_dataset}.rebalancing_moves"
+
+def query_rebalancing_moves(since=None):
+    # since: first move_date to emit (None = full history)
+    lookback_filter = "" if since is None else \
+        f"AND t.trip_start >= DATE_SUB(DATE '{since}', INTERVAL {REBALANCE_MAX_GAP_DAYS} DAY)"
+    since_filter = "" if since is None else f"AND DATE(trip_start_ts) >= DATE '{since}'"
+    return f"""
+WITH chained AS (
+  SELECT
+    t.trip_start_ts,
+    t.start_station_id AS to_station_id,
+    LAG(t.end_station_id) OVER bike_trips AS from_station_id,
+    LAG(t.trip_end_ts) OVER bike_trips AS prev_trip_end_ts
+  FROM `{project_id}.LondonBicycles_Core.fact_trips` t
+  WHERE t.bike_id IS NOT NULL {lookback_filter}
+  WINDOW bike_trips AS (PARTITION BY t.bike_id ORDER BY t.trip_start_ts, t.rental_id)
+),
+moves AS (
+  SELECT
+    DATE(trip_start_ts) AS move_date,
+    EXTRACT(HOUR FROM trip_start_ts) AS move_hour,
+    from_station_id,
+    to_station_id
+  FROM chained
+  WHERE from_station_id IS NOT NULL
+    AND to_station_id IS NOT NULL
+    AND from_station_id != to_station_id
+    AND TIMESTAMP_DIFF(trip_start_ts, prev_trip_end_ts, DAY) < {REBALANCE_MAX_GAP_DAYS}
+    {since_filter}
+),
+station_moves AS (
+  SELECT move_date, move_hour, from_station_id AS station_id, 1 AS bikes_removed, 0 AS bikes_added FROM moves
+  UNION ALL
+  SELECT move_date, move_hour, to_station_id AS station_id, 0 AS bikes_removed, 1 AS bikes_added FROM moves
+)
+SELECT
+  m.move_date,
+  EXTRACT(YEAR FROM m.move_date) AS year,
+  EXTRACT(MONTH FROM m.move_date) AS month,
+  m.move_hour,
+  m.station_id,
+  s.station_name,
+  SUM(m.bikes_removed) AS bikes_removed,
+  SUM(m.bikes_added) AS bikes_added,
+  SUM(m.bikes_added) - SUM(m.bikes_removed) AS net_rebalanced
+FROM station_moves m
+LEFT JOIN `{project_id}.LondonBicycles_Core.dim_stations` s
+  ON m.station_id = s.station_id
+GROUP BY m.move_date, year, month, m.move_hour, m.station_id, s.station_name
+"""
+
+# table_config drops the table first if its declared layout changed
+rebalancing_config = table_config(client, rebalancing_table)
+try:
+    client.get_table(rebalancing_table)
+    rebalance_since = list(budget.query(f"SELECT MAX(move_date) AS since FROM `{rebalancing_table}`").result())[0].since
+except NotFound:
+    rebalance_since = None
+
+if rebalance_since is None:
+    budget.query(query_rebalancing_moves(), job_config=rebalancing_config).result()
+    print(f"✅ Rebalancing moves built: {rebalancing_table}")
+else:
+    # Rebuild from the last loaded day (it may have been partial), append the rest
+    budget.query(f"DELETE FROM `{rebalancing_table}` WHERE move_date >= DATE '{rebalance_since}'").result()
+    budget.query(
+        query_rebalancing_moves(rebalance_since),
+        job_config=table_config(client, rebalancing_table, write_disposition="WRITE_APPEND")
+    ).result()
+    print(f"✅ Rebalancing moves updated from {rebalance_since}: {rebalancing_table}")
+
+# The dashboard only reads the route window (last 12 months, as in
+# route_popularity) at month x hour x station grain: the per-day
+# rebalancing_moves history stays in BigQuery.
+rebalancing_monthly_table = f"{project_id}.{analytics_dataset}.rebalancing_monthly"
+query_rebalancing_monthly = f"""
+SELECT
+  year,
+  month,
+  move_hour,
+  station_name,
+  SUM(bikes_removed) AS bikes_removed,
+  SUM(bikes_added) AS bikes_added,
+  SUM(net_rebalanced) AS net_rebalanced
+FROM `{rebalancing_table}`
+WHERE move_date >= DATE_SUB((SELECT MAX(trip_start) FROM `{project_id}.LondonBicycles_Core.fact_trips`), INTERVAL 12 MONTH)
+GROUP BY year, month, move_hour, station_name
+"""
+budget.query(query_rebalancing_monthly, job_config=table_config(client, rebalancing_monthly_table)).result()
+print(f"✅ Monthly rebalancing saved: {rebalancing_monthly_table}")
+
+# -----------------------------
+# 16. Station occupancy simulation
+# -----------------------------
+# Per-minute arrivals/departures for the last OCCUPANCY_DAYS days drive a
+# clipped bike-count curve per station-day (see londonbikes.occupancy); the
+# minutes each station sat empty or full are stored per station-day.
+OCCUPANCY_DAYS = 90
+
+occupancy_events = budget.query(f"""
+WITH window_start AS (
+  SELECT DATE_SUB(MAX(trip_start), INTERVAL {OCCUPANCY_DAYS} DAY) AS since
+  FROM `{project_id}.LondonBicycles_Core.fact_trips`
+),
+events AS (
+  SELECT end_station_id AS station_id, trip_end_ts AS event_ts, 1 AS inflow, 0 AS outflow
+  FROM `{project_id}.LondonBicycles_Core.fact_trips`
+  WHERE trip_end > (SELECT since FROM window_start)
+  UNION ALL
+  SELECT start_station_id AS station_id, trip_start_ts AS event_ts, 0 AS inflow, 1 AS outflow
+  FROM `{project_id}.LondonBicycles_Core.fact_trips`
+  WHERE trip_start > (SELECT since FROM window_start)
+)
+SELECT
+  station_id,
+  DATE(event_ts) AS date,
+  EXTRACT(HOUR FROM event_ts) * 60 + EXTRACT(MINUTE FROM event_ts) AS minute_of_day,
+  SUM(inflow) AS inflow,
+  SUM(outflow) AS outflow
+FROM events
+WHERE station_id IS NOT NULL
+GROUP BY station_id, date, minute_of_day
+""").to_dataframe(bqstorage_client=bqstorage_client)
+
+station_docks = reader.read(analytics_dataset, "station_static", ["station_id", "docks_count"]).to_pandas()
+occupancy = simulate_occupancy(occupancy_events, station_docks.set_index("station_id")["docks_count"].fillna(0))
+occupancy_table = f"{project_id}.{analytics_dataset}.station_occupancy_daily"
+client.load_table_from_dataframe(occupancy, occupancy_table, job_config=load_config(client, occupancy_table)).result()
+print(f"✅ Station occupancy saved: {occupancy_table} ({len(occupancy)} station-days)")
+
+# -----------------------------
+# 17. Next-day station demand forecast
+# -----------------------------
+# Hour-by-hour starts/ends for the day after the data ends, every station
+# fitted in one batch (see londonbikes.forecast).
+FORECAST_HISTORY_DAYS = 56
+
+forecast_history = budget.query(f"""
+WITH window_start AS (
+  SELECT DATE_SUB(MAX(trip_start), INTERVAL {FORECAST_HISTORY_DAYS} DAY) AS since
+  FROM `{project_id}.LondonBicycles_Core.fact_trips`
+),
+events AS (
+  SELECT start_station_id AS station_id, trip_start_ts AS event_ts, 1 AS starts, 0 AS ends
+  FROM `{project_id}.LondonBicycles_Core.fact_trips`
+  WHERE trip_start > (SELECT since FROM window_start)
+  UNION ALL
+  SELECT end_station_id AS station_id, trip_end_ts AS event_ts, 0 AS starts, 1 AS ends
+  FROM `{project_id}.LondonBicycles_Core.fact_trips`
+  WHERE trip_end > (SELECT since FROM window_start)
+)
+SELECT
+  station_id,
+  DATE(event_ts) AS date,
+  EXTRACT(HOUR FROM event_ts) AS trip_hour,
+  SUM(starts) AS starts,
+  SUM(ends) AS ends
+FROM events
+WHERE station_id IS NOT NULL
+GROUP BY station_id, date, trip_hour
+""").to_dataframe(bqstorage_client=bqstorage_client)
+
+station_names = reader.read(analytics_dataset, "station_static", ["station_id", "station_name"]).to_pandas()
+forecast, forecast_fit_seconds = forecast_demand(
+    forecast_history, station_names.set_index("station_id")["station_name"]
+)
+forecast_table = f"{project_id}.{analytics_dataset}.station_demand_forecast"
+client.load_table_from_dataframe(forecast, forecast_table, job_config=load_config(client, forecast_table)).result()
+forecast_stations = forecast["station_id"].nunique()
+print(f"✅ Demand forecast saved: {forecast_table} ({forecast_stations} stations, "
+      f"fit {forecast_fit_seconds / max(forecast_stations, 1) * 1000:.2f}s per 1,000 stations)")
+
+# -----------------------------
+# 18. Station network metrics
+# -----------------------------
+# Start -> end trip counts over the last NETWORK_DAYS days form a weighted
+# station graph; PageRank, communities and removal disruption are computed
+# on it with sparse matrices (see londonbikes.network) and stored next to
+# station_static.
+NETWORK_DAYS = 365
+
+network_edges = budget.query(f"""
+WITH window_start AS (
+  SELECT DATE_SUB(MAX(trip_start), INTERVAL {NETWORK_DAYS} DAY) AS since
+  FROM `{project_id}.LondonBicycles_Core.fact_trips`
+)
+SELECT start_station_id, end_station_id, COUNT(*) AS trip_count
+FROM `{project_id}.LondonBicycles_Core.fact_trips`
+WHERE trip_start > (SELECT since FROM window_start)
+  AND start_station_id IS NOT NULL
+  AND end_station_id IS NOT NULL
+GROUP BY start_station_id, end_station_id
+""").to_dataframe(bqstorage_client=bqstorage_client)
+
+network, network_seconds, network_modularity = network_metrics(network_edges)
+network_table = f"{project_id}.{analytics_dataset}.station_network_metrics"
+client.load_table_from_dataframe(network, network_table, job_config=load_config(client, network_table)).result()
+print(f"✅ Station network metrics saved: {network_table} ({len(network)} stations, "
+      f"{network['community'].nunique()} communities, modularity {network_modularity:.2f}, {network_seconds:.1f}s)")
+
+# -----------------------------
+# 19. Duration sketches per station x hour x month (incremental)
+# -----------------------------
+# Log-bucketed duration counts (see londonbikes.sketch): any set of
+# stations, hours and months merges into p50/p90/p99 within 1% without
+# rescanning fact_trips. Months are independent, so a run only rebuilds
+# from the last loaded (possibly partial) month onwards.
+sketch_table = f"{project_id}.{analytics_dataset}.duration_sketches"
+
+def query_duration_sketches(since=None):
+    # since: first sketch_month to build (None = full history)
+    since_filter = "" if since is None else f"AND t.trip_start >= DATE '{since}'"
+    return f"""
+SELECT
+  DATE_TRUNC(t.trip_start, MONTH) AS sketch_month,
+  EXTRACT(YEAR FROM t.trip_start) AS year,
+  EXTRACT(MONTH FROM t.trip_start) AS month,
+  EXTRACT(HOUR FROM t.trip_start_ts) AS trip_hour,
+  t.start_station_id AS station_id,
+  {bucket_sql("t.duration")} AS bucket,
+  COUNT(*) AS trip_count
+FROM `{project_id}.LondonBicycles_Core.fact_trips` t
+WHERE t.duration BETWEEN {DURATION_SEC_MIN} AND {DURATION_SEC_MAX}
+  AND t.start_station_id IS NOT NULL
+  {since_filter}
+GROUP BY sketch_month, year, month, trip_hour, station_id, bucket
+"""
+
+# table_config drops the table first if its declared layout changed
+sketch_config = table_config(client, sketch_table)
+try:
+    client.get_table(sketch_table)
+    sketch_since = list(budget.query(f"SELECT MAX(sketch_month) AS since FROM `{sketch_table}`").result())[0].since
+except NotFound:
+    sketch_since = None
+
+if sketch_since is None:
+    budget.query(query_duration_sketches(), job_config=sketch_config).result()
+    print(f"✅ Duration sketches built: {sketch_table}")
+else:
+    budget.query(f"DELETE FROM `{sketch_table}` WHERE sketch_month >= DATE '{sketch_since}'").result()
+    budget.query(
+        query_duration_sketches(sketch_since),
+        job_config=table_config(client, sketch_table, write_disposition="WRITE_APPEND")
+    ).result()
+    print(f"✅ Duration sketches updated from {sketch_since}: {sketch_table}")
+
+sketches = build_duration_sketches(
+    reader.read(analytics_dataset, "duration_sketches", ["station_id", "year", "month", "trip_hour", "bucket", "trip_count"]).to_pandas()
+)
+sketch_p = sketches.percentiles(hours=[8], year_months=sketches.year_months.max())
+print("   8am trips, latest month: " + ", ".join(f"p{q * 100:g} {seconds / 60:.1f} min" for q, seconds in sketch_p.items()))
+
+# -----------------------------
+# 20. Distinct bikes per station per day (HLL sketches, incremental)
+# -----------------------------
+# One HLL_COUNT sketch of bike_id per station-day (bikes starting or ending
+# a trip there); londonbikes.distinct merges them over any date range and
+# station group (~0.8% relative error at HLL_PRECISION 14).
+bike_sketch_table = f"{project_id}.{analytics_dataset}.station_bike_sketches"
+
+def query_bike_sketches(since=None):
+    # since: first date to build (None = full history)
+    start_filter = "" if since is None else f"AND trip_start >= DATE '{since}'"
+    end_filter = "" if since is None else f"AND trip_end >= DATE '{since}'"
+    return f"""
+WITH touches AS (
+  SELECT trip_start AS date, start_station_id AS station_id, bike_id
+  FROM `{project_id}.LondonBicycles_Core.fact_trips`
+  WHERE TRUE {start_filter}
+  UNION ALL
+  SELECT trip_end AS date, end_station_id AS station_id, bike_id
+  FROM `{project_id}.LondonBicycles_Core.fact_trips`
+  WHERE TRUE {end_filter}
+)
+SELECT
+  date,
+  station_id,
+  HLL_COUNT.INIT(bike_id, {HLL_PRECISION}) AS bikes_sketch
+FROM touches
+WHERE station_id IS NOT NULL
+  AND bike_id IS NOT NULL
+GROUP BY date, station_id
+"""
+
+# table_config drops the table first if its declared layout changed
+bike_sketch_config = table_config(client, bike_sketch_table)
+try:
+    client.get_table(bike_sketch_table)
+    bike_sketch_since = list(budget.query(f"SELECT MAX(date) AS since FROM `{bike_sketch_table}`").result())[0].since
+except NotFound:
+    bike_sketch_since = None
+
+if bike_sketch_since is None:
+    budget.query(query_bike_sketches(), job_config=bike_sketch_config).result()
+    print(f"✅ Station bike sketches built: {bike_sketch_table}")
+else:
+    # Rebuild from the last loaded day (it may have been partial), append the rest
+    budget.query(f"DELETE FROM `{bike_sketch_table}` WHERE date >= DATE '{bike_sketch_since}'").result()
+    budget.query(
+        query_bike_sketches(bike_sketch_since),
+        job_config=table_config(client, bike_sketch_table, write_disposition="WRITE_APPEND")
+    ).result()
+    print(f"✅ Station bike sketches updated from {bike_sketch_since}: {bike_sketch_table}")
+
+bike_sketch_end = list(budget.query(f"SELECT MAX(date) AS end_date FROM `{bike_sketch_table}`").result())[0].end_date
+bikes_last_quarter = distinct_bikes(budget, bike_sketch_table, bike_sketch_end - timedelta(days=90), bike_sketch_end)
+print(f"   Distinct bikes, last 90 days: ~{bikes_last_quarter:,} (±{relative_error() * 100:.1f}%)")
+
+# -----------------------------
+# Dashboard snapshot
+# -----------------------------
+# Export the freshly built tables for the dashboard's shared store; the
+# CURRENT pointer only moves once every table has been written.
+snapshot_version = export_snapshot(reader, analytics_dataset)
+print(f"✅ Dashboard snapshot exported: {snapshot_version}")
+
+run_summary = budget.summary()
+print(f"✅ {run_summary['query_count']} queries: {run_summary['estimated_bytes'] / GB:.2f} GB estimated, "
+      f"{run_summary['billed_bytes'] / GB:.2f} GB billed, {run_summary['seconds']:.0f}s")
@@ -1,5 +1,8 @@
 from dagster import asset
 import subprocess
+import json
+import os
+import tempfile
 from great_expectations.data_context import DataContext
 
 @asset
@@ -60,10 +63,29 @@ def ge_validate_stg_cycle_hire(context):
 
 @asset(deps=[ge_validate_stg_cycle_hire])
 def analytics_table(context):
-    result = subprocess.run(["python", "notebooks/business_priya_2.2.py"], capture_output=True, text=True)
+    # The builder dry-runs every query against its byte budget and writes the totals here
+    report_path = os.path.join(tempfile.gettempdir(), f"query_budget_{context.run_id}.json")
+    env = {**os.environ, "LONDONBIKES_BUDGET_REPORT": report_path}
+    result = subprocess.run(["python", "notebooks/business_priya_2.2.py"], capture_output=True, text=True, env=env)
 
     context.log.info(result.stdout)
 
+    if os.path.exists(report_path):
+        with open(report_path) as f:
+            report = json.load(f)
+        os.remove(report_path)
+        context.log.info(
+            f"Query budget: {report['query_count']} queries, {report['refused_count']} refused, "
+            f"{report['estimated_bytes'] / 1024**3:.2f} GB estimated, {report['billed_bytes'] / 1024**3:.2f} GB billed"
+        )
+        context.add_output_metadata({
+            "query_count": report["query_count"],
+            "refused_count": report["refused_count"],
+            "estimated_gb": round(report["estimated_bytes"] / 1024**3, 3),
+            "billed_gb": round(report["billed_bytes"] / 1024**3, 3),
+            "query_seconds": report["seconds"],
+        })
+
     if result.returncode != 0:
         raise Exception(result.stderr)
 
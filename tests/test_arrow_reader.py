@@ -0,0 +1,25 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from londonbikes import clients
+from londonbikes.arrow_reader import ParquetArrowReader, arrow_reader
+
+
+def test_parquet_stand_in_needs_no_credentials(tmp_path, monkeypatch):
+    # No application default credentials anywhere
+    monkeypatch.delenv("GOOGLE_APPLICATION_CREDENTIALS", raising=False)
+    monkeypatch.setattr(clients, "_clients", {})
+
+    def no_credentials():
+        raise AssertionError("credentials resolved for the Parquet stand-in")
+    monkeypatch.setattr(clients, "get_credentials", no_credentials)
+
+    table = pa.table({"year": [2023, 2024], "month": [1, 2], "trip_count": [10, 20]})
+    pq.write_table(table, tmp_path / "monthly_kpis.parquet")
+
+    reader = arrow_reader(clients.get_bqstorage_client, "no-project", parquet_dir=str(tmp_path))
+    assert isinstance(reader, ParquetArrowReader)
+    assert reader.read("LondonBicycles_Analytics", "monthly_kpis", ["year", "trip_count"]).equals(
+        table.select(["year", "trip_count"])
+    )
+    assert sum(batch.num_rows for batch in reader.batches("LondonBicycles_Analytics", "monthly_kpis")) == 2
@@ -0,0 +1,56 @@
+import gc
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from londonbikes import dashboard
+from londonbikes.dashboard import Datasets
+
+
+def histogram_frame(year_months):
+    rng = np.random.default_rng(0)
+    rows = [
+        (year, month, hour, minutes, int(rng.integers(1, 50)))
+        for year, month in year_months for hour in (8, 17) for minutes in range(1, 61)
+    ]
+    return pd.DataFrame(rows, columns=['year', 'month', 'trip_hour', 'duration_minutes_bin', 'trip_count'])
+
+
+def test_duration_summary_without_a_full_year():
+    # Partial snapshot: no year has all 12 months
+    hist = histogram_frame([(2022, m) for m in range(6, 13)] + [(2023, m) for m in range(1, 4)])
+    summary = dashboard.duration_summary(Datasets('partial', {'trip_duration_histogram': hist}))
+    assert summary['latest_full_year'] == 2023
+    assert 0 <= summary['pct_above_30_latest'] <= 100
+    assert np.isfinite(summary['pct_above_30_change'])
+
+
+def test_duration_summary_prefers_latest_full_year():
+    hist = histogram_frame([(2022, m) for m in range(1, 13)] + [(2023, 1)])
+    summary = dashboard.duration_summary(Datasets('full', {'trip_duration_histogram': hist}))
+    assert summary['latest_full_year'] == 2022
+    assert np.isnan(summary['pct_above_30_change'])
+
+
+def test_memos_key_on_version_without_pinning_datasets():
+    dashboard.duration_summary.cache_clear()
+    old = Datasets('v1', {'trip_duration_histogram': histogram_frame([(2022, m) for m in range(1, 13)])})
+    new = Datasets('v2', {'trip_duration_histogram': histogram_frame([(2023, m) for m in range(1, 13)])})
+    old_ref = weakref.ref(old)
+
+    # Sessions on both versions during a refresh keep each other's entries
+    for _ in range(3):
+        assert dashboard.duration_summary(old)['latest_full_year'] == 2022
+        assert dashboard.duration_summary(new)['latest_full_year'] == 2023
+    info = dashboard.duration_summary.cache_info()
+    assert (info.misses, info.hits) == (2, 4)
+
+    # A fresh Datasets of the same version hits the memo
+    same = Datasets('v2', {})
+    assert dashboard.duration_summary(same)['latest_full_year'] == 2023
+
+    # The memo does not keep the old version's tables alive
+    del old
+    gc.collect()
+    assert old_ref() is None
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from londonbikes.forecast import FORECAST_COLUMNS, forecast_demand, history_tensor
+
+
+def history_frame(seed=0, days=21):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2024-01-01", periods=days).date
+    history = pd.DataFrame(
+        [(station_id, date, hour) for station_id in (7, 11) for date in dates for hour in range(24)],
+        columns=["station_id", "date", "trip_hour"],
+    )
+    history["starts"] = rng.poisson(3, len(history))
+    history["ends"] = rng.poisson(3, len(history))
+    return history
+
+
+def test_history_tensor_accepts_nullable_int64():
+    # BigQuery's to_dataframe returns INT64 columns as nullable Int64
+    history = history_frame()
+    nullable = history.astype({col: "Int64" for col in ("station_id", "trip_hour", "starts", "ends")})
+
+    tensor, station_ids, dates = history_tensor(nullable)
+    expected, expected_ids, expected_dates = history_tensor(history)
+    np.testing.assert_array_equal(tensor, expected)
+    np.testing.assert_array_equal(station_ids, expected_ids)
+    np.testing.assert_array_equal(dates, expected_dates)
+    assert tensor.shape == (2, 21, 24, 2)
+    assert tensor[..., 0].sum() == history["starts"].sum()
+
+
+def test_forecast_demand_from_nullable_frame():
+    history = history_frame().astype({col: "Int64" for col in ("station_id", "trip_hour", "starts", "ends")})
+    forecast, _ = forecast_demand(history, pd.Series({7: "A", 11: "B"}), workers=1)
+    assert list(forecast.columns) == FORECAST_COLUMNS
+    assert len(forecast) == 2 * 24
+    assert (forecast["forecast_date"].astype(str) == "2024-01-22").all()
+    assert (forecast[["forecast_starts", "forecast_ends"]] >= 0).all().all()
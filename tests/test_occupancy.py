@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from londonbikes.occupancy import MINUTES_PER_DAY, OCCUPANCY_COLUMNS, simulate_occupancy, simulate_station
+
+
+def naive_walk(net, docks, initial_fill=0.5):
+    # Minute-by-minute reference: one clipped walk carried across days
+    level = int(round(docks * initial_fill))
+    occupancy = np.empty(net.shape, dtype=np.int64)
+    deficit = np.zeros(len(net), dtype=np.int64)
+    overflow = np.zeros(len(net), dtype=np.int64)
+    for day in range(net.shape[0]):
+        for minute in range(net.shape[1]):
+            level += net[day, minute]
+            if level < 0:
+                deficit[day] -= level
+                level = 0
+            elif level > docks:
+                overflow[day] += level - docks
+                level = docks
+            occupancy[day, minute] = level
+    return occupancy, deficit, overflow
+
+
+def events_frame(rng, station_ids, dates, n):
+    return pd.DataFrame({
+        "station_id": rng.choice(station_ids, n),
+        "date": rng.choice(dates, n),
+        "minute_of_day": rng.integers(0, MINUTES_PER_DAY, n),
+        "inflow": rng.integers(0, 4, n),
+        "outflow": rng.integers(0, 4, n),
+    })
+
+
+def test_simulate_station_matches_naive_walk():
+    rng = np.random.default_rng(0)
+    net = rng.integers(-1, 2, size=(5, MINUTES_PER_DAY)) * rng.integers(0, 2, size=(5, MINUTES_PER_DAY))
+    net[2] = 0                                   # a day without events
+    net[3, :200] = -1                            # drains the station
+    for docks in (3, 10, 40):
+        occupancy, deficit, overflow = simulate_station(net, docks)
+        expected = naive_walk(net, docks)
+        np.testing.assert_array_equal(occupancy, expected[0])
+        np.testing.assert_array_equal(deficit, expected[1])
+        np.testing.assert_array_equal(overflow, expected[2])
+
+
+def test_level_carries_over_days_without_events():
+    # 5 arrivals on day 1, nothing on day 2, 5 departures on day 3
+    events = pd.DataFrame({
+        "station_id": [1, 1],
+        "date": [pd.Timestamp("2024-01-01").date(), pd.Timestamp("2024-01-03").date()],
+        "minute_of_day": [600, 600],
+        "inflow": [5, 0],
+        "outflow": [0, 5],
+    })
+    occupancy = simulate_occupancy(events, pd.Series({1: 20}), workers=1)
+    assert list(occupancy["date"].astype(str)) == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert list(occupancy["start_bikes"]) == [10, 15, 15]
+    assert list(occupancy["end_bikes"]) == [15, 15, 10]
+
+
+def test_nullable_int64_columns():
+    # BigQuery's to_dataframe returns INT64 columns as nullable Int64
+    rng = np.random.default_rng(1)
+    dates = pd.date_range("2024-03-01", "2024-03-06").date
+    events = events_frame(rng, [1, 2, 3], dates, 2000)
+    events = events.groupby(["station_id", "date", "minute_of_day"], as_index=False).sum()
+    docks = pd.Series({1: 12, 2: 25, 3: 0}, dtype="Int64")
+
+    plain = simulate_occupancy(events, docks.astype("int64"), workers=1)
+    nullable = simulate_occupancy(
+        events.astype({col: "Int64" for col in ("station_id", "minute_of_day", "inflow", "outflow")}),
+        docks, workers=1
+    )
+    assert list(nullable.columns) == OCCUPANCY_COLUMNS
+    assert set(nullable["station_id"]) == {1, 2}
+    pd.testing.assert_frame_equal(
+        plain.reset_index(drop=True), nullable.reset_index(drop=True), check_dtype=False
+    )
@@ -0,0 +1,60 @@
+import pyarrow.parquet as pq
+
+from londonbikes.tfl_ingest import ingest_tfl_csvs
+
+OLD_HEADER = ("Rental Id,Duration,Bike Id,End Date,EndStation Id,EndStation Name,"
+              "Start Date,StartStation Id,StartStation Name")
+NEW_HEADER = ("Number,Start date,Start station number,Start station,End date,End station number,"
+              "End station,Bike number,Bike model,Total duration,Total duration (ms)")
+
+
+def write_csv(path, header, rows):
+    path.write_text("\n".join([header] + rows) + "\n")
+
+
+def ingest(tmp_path, files):
+    csv_dir = tmp_path / "csv"
+    csv_dir.mkdir()
+    for name, header, rows in files:
+        write_csv(csv_dir / name, header, rows)
+    out_dir = tmp_path / "out"
+    summary = ingest_tfl_csvs(str(csv_dir), str(out_dir), workers=1)
+    table = pq.read_table(out_dir / "start_month=2022-09" / "part-0.parquet")
+    return summary, {row["rental_id"]: row for row in table.to_pylist()}
+
+
+OLD_ROWS = [
+    '100,600,7,05/09/2022 08:10,14,"Belgrove Street , King\'s Cross",05/09/2022 08:00,1,"River Street , Clerkenwell"',
+    '101,300,8,06/09/2022 09:05,1,"River Street , Clerkenwell",06/09/2022 09:00,14,"Belgrove Street , King\'s Cross"',
+]
+NEW_ROWS = [
+    # Rental 100 again, with terminal numbers only (no station ids)
+    '100,2022-09-05 08:00,001023,"River Street , Clerkenwell",2022-09-05 08:10,001019,'
+    '"Belgrove Street , King\'s Cross",7,CLASSIC,10m 0s,600000',
+    '102,2022-09-20 10:00,001019,"Belgrove Street , King\'s Cross",2022-09-20 10:30,001023,'
+    '"River Street , Clerkenwell",9,PBSC_EBIKE,30m 0s,1800000',
+]
+
+
+def test_overlapping_rental_keeps_resolved_station_ids(tmp_path):
+    # Whichever file name sorts first, the old-format row with station ids wins
+    for old_name, new_name in [("b_old.csv", "a_new.csv"), ("a_old.csv", "b_new.csv")]:
+        root = tmp_path / old_name
+        root.mkdir()
+        summary, rows = ingest(root, [(old_name, OLD_HEADER, OLD_ROWS), (new_name, NEW_HEADER, NEW_ROWS)])
+        assert summary["duplicates"] == 1
+        assert sorted(rows) == [100, 101, 102]
+        assert rows[100]["start_station_id"] == 1
+        assert rows[100]["end_station_id"] == 14
+        assert rows[102]["start_station_id"] is None
+        assert rows[102]["start_station_logical_terminal"] == 1019
+
+
+def test_overlapping_rental_prefers_most_recent_source(tmp_path):
+    # Same completeness: the file whose data reaches later wins, not the later file name
+    later = OLD_ROWS[0].replace("100,600,", "100,660,")
+    for early_name, late_name in [("b.csv", "a.csv"), ("a.csv", "b.csv")]:
+        root = tmp_path / early_name
+        root.mkdir()
+        _, rows = ingest(root, [(early_name, OLD_HEADER, OLD_ROWS[:1]), (late_name, OLD_HEADER, [later] + OLD_ROWS[1:])])
+        assert rows[100]["duration"] == 660